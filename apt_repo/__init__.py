@@ -1,12 +1,31 @@
 import bz2
-import logging
+import codecs
 import gzip
+import hashlib
+import logging
 import lzma
+import os
 import re
+import sys
+import threading
+import time
 import urllib.error
 import urllib.request as request
-import pydpkg
+import zlib
 from binascii import unhexlify
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import IndexCache
+from .graph import DependencyGraph
+from .lazy import PackagesFileIndex
+from .metrics import NULL_METRICS, Metrics
+from .parallel import parse_packages_chunks, parse_packages_file, start_pool
+from .pdiff import PDiffIndex, apply_ed_patch
+from .query import PackageTable
+from .resolver import DependencyResolver
+from .snapshot import PackageSnapshot, write_snapshot
+from .solver import DependencySolver
+from .version import compare_versions
 
 
 def __download_raw(url):
@@ -29,7 +48,20 @@ def _download(url):
     return __download_raw(url).decode('utf-8')
 
 
-def _download_compressed(base_url):
+_DECOMPRESSORS = {
+    '': lambda: None,
+    '.xz': lzma.LZMADecompressor,
+    '.gz': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    '.bz2': bz2.BZ2Decompressor
+}
+
+_COMPRESSION_SUFFIXES = ['.xz', '.bz2', '.gz', '']
+
+# guards starting the process pools parsing Packages files, see `APTRepository._parse_pool`
+_parse_pool_lock = threading.Lock()
+
+
+def _download_compressed(base_url, suffixes=_COMPRESSION_SUFFIXES):
     """
     Downloads a compressed file
 
@@ -37,15 +69,26 @@ def _download_compressed(base_url):
 
     # Arguments
     url (str): URL to file
+    suffixes (list): the compression suffixes to try in order of preference
+    """
+    opened = _open_compressed(base_url, suffixes)
+    if opened is not None:
+        return b''.join(_iter_decompressed(*opened)).decode('utf-8')
+
+
+def _open_compressed(base_url, suffixes=_COMPRESSION_SUFFIXES):
     """
-    decompress = {
-        '': lambda c: c,
-        '.xz': lambda c: lzma.decompress(c),
-        '.gz': lambda c: gzip.decompress(c),
-        '.bzip2': lambda c: bz2.decompress(c)
-    }
+    Opens a compressed file for streaming
 
-    for suffix, method in decompress.items():
+    Like `_download_compressed` it tries out multiple compression algorithms by iterating through the according
+    file suffixes, but it only opens the response and returns it together with a matching incremental decompressor.
+    Returns `None` if no variant could be opened.
+
+    # Arguments
+    base_url (str): URL to file without compression suffix
+    suffixes (list): the compression suffixes to try in order of preference
+    """
+    for suffix in suffixes:
         url = base_url + suffix
 
         try:
@@ -54,15 +97,96 @@ def _download_compressed(base_url):
             continue
         logging.getLogger(__name__).info('Download "{}"'.format(url))
 
-        return method(req.read()).decode('utf-8')
+        return req, _DECOMPRESSORS[suffix]()
+
+
+def _iter_decompressed(req, decompressor, chunk_size=2**16, metrics=NULL_METRICS):
+    """
+    Yields the decompressed content of an opened response chunk by chunk
+
+    # Arguments
+    req: the response as returned by `_open_compressed`
+    decompressor: the incremental decompressor, `None` for uncompressed content
+    chunk_size (int): number of compressed bytes to read at once
+    metrics (Metrics): records the `fetch` and `decompress` timings and the transfer, default: disabled
+    """
+    if metrics.enabled:
+        yield from _iter_decompressed_measured(req, decompressor, chunk_size, metrics)
+        return
+    with req:
+        chunk = req.read(chunk_size)
+        while chunk:
+            yield decompressor.decompress(chunk) if decompressor else chunk
+            chunk = req.read(chunk_size)
+
+
+def _iter_decompressed_measured(req, decompressor, chunk_size, metrics):
+    """Like `_iter_decompressed`, but measures the time spent reading and decompressing"""
+    size = 0
+    fetch = decompress = 0.0
+    with req:
+        while True:
+            start = time.perf_counter()
+            chunk = req.read(chunk_size)
+            fetch += time.perf_counter() - start
+            if not chunk:
+                break
+            size += len(chunk)
+            if decompressor:
+                start = time.perf_counter()
+                chunk = decompressor.decompress(chunk)
+                decompress += time.perf_counter() - start
+            yield chunk
+        metrics.transfer(req.geturl(), size, fetch)
+        metrics.timing('fetch', fetch)
+        metrics.count('fetch.bytes', size)
+        if decompressor:
+            metrics.timing('decompress', decompress)
+
+
+def _iter_stanzas(chunks):
+    """
+    Yields the stanzas of a Packages-like file as soon as they are complete
+
+    Only the incomplete trailing stanza is buffered, so memory usage is bounded by the size of a single stanza
+    plus the size of a chunk.
+
+    # Arguments
+    chunks (iterable): UTF-8 encoded chunks of the file
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    for chunk in chunks:
+        *stanzas, buffer = (buffer + decoder.decode(chunk)).split('\n\n')
+        for stanza in stanzas:
+            if stanza.strip():
+                yield stanza
+    buffer += decoder.decode(b'', final=True)
+    if buffer.strip():
+        yield buffer
+
+
+def _parse_stanza(content):
+    """
+    Parses a RFC822 style stanza into a dictionary mapping field names to values
 
+    Continuation lines (starting with a space or tab) are appended to the value of the preceding field,
+    separated by newlines, so multi-line fields like `Description` or `SHA256` are kept intact.
 
-def _get_value(content, key):
-    match = re.search(r'^' + key + ': (.*)$', content, flags=re.MULTILINE)
-    try:
-        return match.group(1)
-    except AttributeError:
-        raise KeyError(content, key)
+    # Arguments
+    content (str): the stanza to parse
+    """
+    fields = {}
+    lines = None
+    for line in content.split('\n'):
+        if line[:1] in (' ', '\t'):
+            if lines is not None:
+                lines.append(line.rstrip())
+        elif line:
+            key, _, value = line.partition(':')
+            lines = [value.strip()]
+            fields[key] = lines
+    return {key: '\n'.join(lines) if len(lines) > 1 else lines[0] for key, lines in fields.items()}
 
 
 class ReleaseFile:
@@ -75,49 +199,66 @@ class ReleaseFile:
     def __init__(self, content):
         self.content = content.strip()
 
+    @property
+    def fields(self):
+        """Returns a dictionary of all fields of this Release file"""
+        if not hasattr(self, '_cache_fields'):
+            self._cache_fields = _parse_stanza(self.content)
+        return self._cache_fields
+
     @property
     def origin(self):
-        return _get_value(self.content, 'Origin')
+        return self.fields['Origin']
 
     @property
     def label(self):
-        return _get_value(self.content, 'Label')
+        return self.fields['Label']
 
     @property
     def suite(self):
-        return _get_value(self.content, 'Suite')
+        return self.fields['Suite']
 
     @property
     def version(self):
-        return _get_value(self.content, 'Version')
+        return self.fields['Version']
 
     @property
     def codename(self):
-        return _get_value(self.content, 'Codename')
+        return self.fields['Codename']
 
     @property
     def date(self):
-        return _get_value(self.content, 'Date')
+        return self.fields['Date']
 
     @property
     def architectures(self):
-        return _get_value(self.content, 'Architectures').split()
+        return self.fields['Architectures'].split()
 
     @property
     def components(self):
-        return _get_value(self.content, 'Components').split()
+        return self.fields['Components'].split()
 
     @property
     def description(self):
-        return _get_value(self.content, 'Description')
+        return self.fields['Description']
 
     @property
     def metafiles(self):
-        match = re.search(r'^SHA256:\n((?: .+\n)+)', self.content, flags=re.MULTILINE)
-        if not match:
-            match = re.search(r'^MD5Sum:\n((?: .+\n)+)', self.content, flags=re.MULTILINE)
-        if match:
-            return [(unhexlify(hash), filename) for hash, filename in re.findall(r' (\w+)\s+\d+ (\S+)', match.group(1))]
+        hashes = self.fields.get('SHA256') or self.fields.get('MD5Sum')
+        if hashes:
+            return [(unhexlify(hash), filename) for hash, filename in re.findall(r' (\w+)\s+\d+ (\S+)', hashes)]
+
+    def checksums(self, algorithm='SHA256'):
+        """
+        Returns a dictionary mapping the files listed in the Release file to their hash and size
+
+        # Arguments
+        algorithm (str): the hash field to read, e.g. 'SHA256' or 'MD5Sum'
+        """
+        return {
+            filename: (hash, int(size))
+            for hash, size, filename in re.findall(r' (\w+)\s+(\d+) (\S+)', self.fields.get(algorithm, ''))
+        }
 
 
 class PackagesFile:
@@ -144,8 +285,25 @@ class PackagesFile:
         return packages
 
 
+class SourcesFile:
+    """
+    Class that represents a Sources file
+
+    # Arguments
+    content (str): the content of the Sources file
+    """
+    def __init__(self, content, repository):
+        self.content = content.strip()
+        self.repository = repository
+
+    @property
+    def packages(self):
+        """Returns all source packages in this Sources file"""
+        return [SourcePackage(stanza, self.repository) for stanza in self.content.split('\n\n') if stanza]
+
+
 class BinaryPackageDependency():
-    re_dependency = re.compile(r'^(?P<package_name>\S+?)(?::(?P<architecture>\S+))?(?: \((?P<constraint>>>|<<|>=|=) (?P<version>\S+)\))?$')
+    re_dependency = re.compile(r'^(?P<package_name>\S+?)(?::(?P<architecture>\S+))?(?: \((?P<constraint>>>|<<|>=|<=|=|>|<) (?P<version>\S+)\))?$')
 
     def __init__(self, content):
         if '|' in content:
@@ -163,14 +321,19 @@ class BinaryPackageDependency():
             return False
         if self.constraint is None:
             return True
+        result = compare_versions(package.version, self.version)
         if self.constraint == '>=':
-            return pydpkg.Dpkg.compare_versions(package.version, self.version) >= 0
+            return result >= 0
         elif self.constraint == '=':
-            return pydpkg.Dpkg.compare_versions(package.version, self.version) == 0
+            return result == 0
         elif self.constraint == '<<':
-            return pydpkg.Dpkg.compare_versions(package.version, self.version) < 0
+            return result < 0
         elif self.constraint == '>>':
-            return pydpkg.Dpkg.compare_versions(package.version, self.version) > 0
+            return result > 0
+        elif self.constraint in ('<=', '<'):
+            return result <= 0
+        elif self.constraint == '>':
+            return result >= 0
         return False
 
     def __str__(self):
@@ -190,49 +353,95 @@ class BinaryPackage:
     # Arguments
     content (str): the section of the Packages file for this specific package
     """
+    __slots__ = (
+        'content', 'repository', '_cache_fields', '_cache_package', '_cache_provides', '_cache_depends',
+        '_cache_predepends',
+    )
+
     def __init__(self, content, repository):
         self.content = content.strip()
         self.repository = repository
 
+    @property
+    def fields(self):
+        """Returns a dictionary of all fields of this package's stanza"""
+        if not hasattr(self, '_cache_fields'):
+            self._cache_fields = _parse_stanza(self.content)
+        return self._cache_fields
+
     @property
     def package(self):
-        return _get_value(self.content, 'Package')
+        try:
+            return self._cache_package
+        except AttributeError:
+            self._cache_package = self.fields['Package']
+            return self._cache_package
 
     @property
     def version(self):
-        return _get_value(self.content, 'Version')
+        return self.fields['Version']
 
     @property
     def filename(self):
-        return _get_value(self.content, 'Filename')
+        return self.fields['Filename']
 
     @property
     def provides(self):
         if hasattr(self, '_cache_provides'):
             return self._cache_provides
         try:
-            self._cache_provides = [p.strip() for p in _get_value(self.content, 'Provides').split(',')]
+            self._cache_provides = [p.strip() for p in self.fields['Provides'].split(',')]
         except KeyError:
             self._cache_provides = []
         return self._cache_provides
 
     @property
     def recommends(self):
+        """Returns the dependencies of the `Recommends` field"""
+        return self._relations('Recommends')
+
+    @property
+    def conflicts(self):
+        return self._relations('Conflicts')
+
+    @property
+    def breaks(self):
+        return self._relations('Breaks')
+
+    @property
+    def multi_arch(self):
+        """Returns the value of the `Multi-Arch` field, e.g. `'same'`, `'foreign'` or `'allowed'`, or None"""
+        return self.fields.get('Multi-Arch')
+
+    def _relations(self, key):
         try:
-            return _get_value(self.content, 'Recommends')
+            return [BinaryPackageDependency(s) for s in self.fields[key].split(',')]
         except KeyError:
             return []
 
     @property
     def sha1(self):
-        return _get_value(self.content, 'SHA1')
+        return self.fields['SHA1']
+
+    @property
+    def sha256(self):
+        return self.fields['SHA256']
+
+    @property
+    def checksum(self):
+        """Returns the strongest hash of the package file as a tuple of the `hashlib` algorithm and the hex digest"""
+        fields = self.fields
+        for key, algorithm in [('SHA512', 'sha512'), ('SHA256', 'sha256'), ('SHA1', 'sha1'), ('MD5sum', 'md5')]:
+            if key in fields:
+                return algorithm, fields[key]
+        raise KeyError('SHA256')
 
     @property
     def depends(self):
         if hasattr(self, '_cache_depends'):
             return self._cache_depends
         try:
-            self._cache_depends = [BinaryPackageDependency(s) for s in _get_value(self.content, 'Depends').split(',')]
+            self._cache_depends = [BinaryPackageDependency(s) for s in self.fields['Depends'].split(',')]
         except KeyError:
             self._cache_depends = []
         return self._cache_depends
@@ -242,35 +451,28 @@ class BinaryPackage:
         if hasattr(self, '_cache_predepends'):
             return self._cache_predepends
         try:
-            self._cache_predepends = [BinaryPackageDependency(s) for s in _get_value(self.content, 'Pre-Depends').split(',')]
+            self._cache_predepends = [BinaryPackageDependency(s) for s in self.fields['Pre-Depends'].split(',')]
         except KeyError:
             self._cache_predepends = []
         return self._cache_predepends
 
     @property
     def architecture(self):
-        return _get_value(self.content, 'Architecture')
+        return self.fields['Architecture']
 
     @property
     def size(self):
-        return int(_get_value(self.content, 'Size'))
+        return int(self.fields['Size'])
 
     def dependencies(self, sources, summed_deps=None):
-        if summed_deps is None:
-            summed_deps = set()
-        summed_deps.add(self)
-        logging.getLogger(__name__).debug('Check dependencies of {}'.format(self))
-        for dep in self.depends + self.predepends:
-            if len([p for p in summed_deps if dep.fulfilled(p)]) > 0:
-                continue
-            packs_fulfilling = []
-            for pack in sources.packages_fulfilling(dep):
-                packs_fulfilling.append(pack)
-                pack.dependencies(sources, summed_deps)
-            if len(packs_fulfilling) == 0:
-                logging.getLogger(__name__).warning('No package found matching "{}"'.format(dep))
-                # raise Exception('No package found matching "{}"'.format(dep))
-        return summed_deps
+        """
+        Returns this package and recursively all packages fulfilling its dependencies
+
+        # Arguments
+        sources (APTSources): the sources to pick dependencies from
+        summed_deps (set): packages already resolved, new packages are added to it
+        """
+        return DependencyResolver(sources, summed_deps).add(self)
 
     def __str__(self):
         return '{} {} {}'.format(self.package, self.architecture, self.version)
@@ -279,6 +481,248 @@ class BinaryPackage:
         return str(self)
 
 
+class CompactBinaryPackage(BinaryPackage):
+    """
+    Memory efficient variant of `BinaryPackage`
+
+    Only the fields listed in `FIELDS` are extracted from the stanza and stored as interned strings, so values like
+    names, versions, architectures and filenames shared between packages and repositories are stored only once.
+    The raw stanza text is dropped, `content` is regenerated from the kept fields on access.
+
+    # Arguments
+    content (str): the section of the Packages file for this specific package
+    """
+    FIELDS = (
+        'Package', 'Architecture', 'Version', 'Section', 'Priority', 'Provides', 'Depends', 'Pre-Depends',
+        'Recommends', 'Conflicts', 'Breaks', 'Filename', 'Size', 'MD5sum', 'SHA1', 'SHA256', 'SHA512', 'Multi-Arch',
+    )
+    _index = {key: index for index, key in enumerate(FIELDS)}
+
+    __slots__ = ('values',)
+
+    def __init__(self, content, repository):
+        fields = _parse_stanza(content)
+        self.values = tuple(sys.intern(fields[key]) if key in fields else None for key in self.FIELDS)
+        self.repository = repository
+
+    def __getstate__(self):
+        return self.values, self.repository
+
+    def __setstate__(self, state):
+        self.values, self.repository = state
+        if len(self.values) != len(self.FIELDS):
+            raise ValueError('Package values do not match the fields {}'.format(', '.join(self.FIELDS)))
+
+    @property
+    def content(self):
+        return '\n'.join('{}: {}'.format(key, value) for key, value in self.fields.items())
+
+    @property
+    def fields(self):
+        """Returns a dictionary of all kept fields of this package"""
+        return {key: value for key, value in zip(self.FIELDS, self.values) if value is not None}
+
+    def _get_value(self, key):
+        value = self.values[self._index[key]]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    @property
+    def package(self):
+        return self._get_value('Package')
+
+    @property
+    def version(self):
+        return self._get_value('Version')
+
+    @property
+    def filename(self):
+        return self._get_value('Filename')
+
+    @property
+    def sha1(self):
+        return self._get_value('SHA1')
+
+    @property
+    def sha256(self):
+        return self._get_value('SHA256')
+
+    @property
+    def multi_arch(self):
+        return self.values[self._index['Multi-Arch']]
+
+    @property
+    def architecture(self):
+        return self._get_value('Architecture')
+
+    @property
+    def size(self):
+        return int(self._get_value('Size'))
+
+
+class SnapshotBinaryPackage(CompactBinaryPackage):
+    """
+    View of a package in a `PackageSnapshot`
+
+    Field values are read from the memory-mapped snapshot on access instead of being stored in the object.
+    Pickled views become `CompactBinaryPackage`s, so they do not depend on the snapshot file.
+
+    # Arguments
+    snapshot (PackageSnapshot): the snapshot containing the package
+    index (int): the index of the package in the snapshot
+    """
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot, index, repository):
+        self.snapshot = snapshot
+        self.index = index
+        self.repository = repository
+
+    def __reduce__(self):
+        return object.__new__, (CompactBinaryPackage,), (self.values, self.repository)
+
+    @property
+    def values(self):
+        return self.snapshot.row(self.index)
+
+    def _get_value(self, key):
+        value = self.snapshot.value(self.index, self._index[key])
+        if value is None:
+            raise KeyError(key)
+        return value
+
+
+class SourcePackage:
+    """
+    Class that represents a Debian source package as listed in a Sources file
+
+    # Arguments
+    content (str): the section of the Sources file for this specific package
+    """
+    __slots__ = ('content', 'repository', '_cache_fields', '_cache_package')
+
+    re_build_dependency = re.compile(
+        r'^(?P<name>[^\s(\[<]+)\s*'
+        r'(?:\(\s*(?P<constraint>>>|<<|>=|<=|=|>|<)\s*(?P<version>[^)\s]+)\s*\))?\s*'
+        r'(?:\[(?P<architectures>[^\]]*)\])?\s*'
+        r'(?P<profiles>(?:<[^>]*>\s*)*)$'
+    )
+
+    def __init__(self, content, repository):
+        self.content = content.strip()
+        self.repository = repository
+
+    @property
+    def fields(self):
+        """Returns a dictionary of all fields of this package's stanza"""
+        if not hasattr(self, '_cache_fields'):
+            self._cache_fields = _parse_stanza(self.content)
+        return self._cache_fields
+
+    @property
+    def package(self):
+        try:
+            return self._cache_package
+        except AttributeError:
+            self._cache_package = self.fields['Package']
+            return self._cache_package
+
+    @property
+    def version(self):
+        return self.fields['Version']
+
+    @property
+    def binaries(self):
+        """Returns the names of the binary packages built from this source package"""
+        return [name.strip() for name in self.fields.get('Binary', '').replace('\n', ' ').split(',') if name.strip()]
+
+    @property
+    def architecture(self):
+        return self.fields['Architecture']
+
+    @property
+    def directory(self):
+        return self.fields['Directory']
+
+    @property
+    def files(self):
+        """
+        Returns the files of this source package, i.e. the .dsc, the original tarballs and the Debian changes
+
+        Each file is a tuple of its path relative to the repository, its size and its hash as a tuple of the
+        `hashlib` algorithm and the hex digest. SHA256 is preferred, as the content store of mirrors is keyed by it.
+        """
+        for key, algorithm in [('Checksums-Sha256', 'sha256'), ('Checksums-Sha512', 'sha512'),
+                               ('Checksums-Sha1', 'sha1'), ('Files', 'md5')]:
+            if key in self.fields:
+                return [
+                    ('/'.join([self.directory, name]), int(size), (algorithm, digest))
+                    for digest, size, name in (line.split() for line in self.fields[key].split('\n') if line.strip())
+                ]
+        return []
+
+    @staticmethod
+    def _restrictions_apply(match, arch):
+        """Checks if the architecture and build profile restrictions of a build dependency hold for arch"""
+        if arch is not None and match.group('architectures'):
+            tokens = match.group('architectures').split()
+
+            def matches(token):
+                token = token.lstrip('!')
+                return token in (arch, 'any', 'linux-any', 'any-' + arch)
+
+            if tokens[0].startswith('!'):
+                if any(matches(token) for token in tokens):
+                    return False
+            elif not any(matches(token) for token in tokens):
+                return False
+        profiles = re.findall(r'<([^>]*)>', match.group('profiles'))
+        return not profiles or any(all(term.startswith('!') for term in group.split()) for group in profiles)
+
+    def build_depends(self, arch=None):
+        """
+        Returns the dependencies of `Build-Depends`, `Build-Depends-Arch` and `Build-Depends-Indep`
+
+        Dependencies restricted to build profiles are only included if they apply without any profile enabled.
+
+        # Arguments
+        arch (str): the architecture to build for, dependencies restricted to other architectures are skipped,
+            default: None, which includes dependencies for all architectures
+        """
+        dependencies = []
+        for key in ['Build-Depends', 'Build-Depends-Arch', 'Build-Depends-Indep']:
+            for group in self.fields.get(key, '').replace('\n', ' ').split(','):
+                alternatives = []
+                for alternative in group.split('|'):
+                    match = self.re_build_dependency.match(alternative.strip())
+                    if match is None or not self._restrictions_apply(match, arch):
+                        continue
+                    alternatives.append(match.group('name') + (
+                        ' ({} {})'.format(match.group('constraint'), match.group('version'))
+                        if match.group('constraint') else ''
+                    ))
+                if alternatives:
+                    dependencies.append(BinaryPackageDependency(' | '.join(alternatives)))
+        return dependencies
+
+    def build_dependencies(self, sources, arch=None):
+        """
+        Returns all binary packages fulfilling the build dependencies and recursively their dependencies
+
+        # Arguments
+        sources (APTSources): the sources to pick the binary packages from
+        arch (str): the architecture to build for, see `build_depends`
+        """
+        return DependencyResolver(sources).add_dependencies(self.build_depends(arch))
+
+    def __str__(self):
+        return '{} {} (source)'.format(self.package, self.version)
+
+    def __repr__(self):
+        return str(self)
+
+
 class APTRepository:
     """
     Class that represents a single APT repository
@@ -287,26 +731,80 @@ class APTRepository:
     url (str): the base URL of the repository
     dist (str): the target distribution
     components (list): the target components
+    architectures (list): the target architectures
+    compact (bool): store packages as `CompactBinaryPackage` to reduce memory usage, default: False
+    max_workers (int): maximum number of Packages files downloaded and parsed concurrently, default: 4
+    cache (IndexCache): persistent cache for Release and Packages files, default: None
+    compressions (list): compression suffixes of Packages files in order of preference, e.g. `['.xz', '.gz']`,
+        default: the smallest variant listed in the Release file
+    lazy (bool): answer `get`, `get_provided` and `get_binary_packages` by parsing only the stanzas of the
+        requested names out of the cached Packages files, requires `cache`, default: False
+    metrics (Metrics): records timings and counters of fetching and parsing, default: disabled or the metrics of
+        the `APTSources` the repository is added to
+    parse_processes (int): parse each Packages file in a pool of this many processes, which pays off for large
+        indexes on machines with many cores, default: None, which parses in the calling thread
 
     # Examples
     ```python
     APTRepository('http://archive.ubuntu.com/ubuntu', 'bionic', 'main')
     ```
     """
-    def __init__(self, url, dist, components, architectures=['amd64', 'i386']):
+    def __init__(self, url, dist, components, architectures=['amd64', 'i386'], compact=False, max_workers=4,
+                 cache=None, compressions=None, lazy=False, metrics=None, parse_processes=None):
         self.url = url
         self.dist = dist
         self.components = components
         self.architectures = architectures
+        self.compact = compact
+        self.max_workers = max_workers
+        self.cache = cache
+        self.compressions = compressions
+        self.lazy = lazy
+        self.metrics = metrics or NULL_METRICS
+        self.parse_processes = parse_processes
+        if lazy and cache is None:
+            raise ValueError('Lazy loading requires a cache')
 
     def get(self, item):
+        if hasattr(self, '_cache_snapshot') and not hasattr(self, '_cache_packages'):
+            return self._cache_snapshot.get(item)
+        if self.lazy and not hasattr(self, '_cache_packages'):
+            return [pack for index in self._indexes for pack in self._lazy_index(*index).get(item)]
         return self.packages.get(item, [])
 
     def get_provided(self, item):
+        if hasattr(self, '_cache_snapshot') and not hasattr(self, '_cache_packages'):
+            return set(self._cache_snapshot.get_provided(item))
+        if self.lazy and not hasattr(self, '_cache_packages'):
+            return {pack for index in self._indexes for pack in self._lazy_index(*index).get_provided(item)}
         if not hasattr(self, '_cache_provided_packages'):
             packs = self.packages
         return self._cache_provided_packages.get(item, [])
 
+    def _lazy_index(self, component, arch, retry=3):
+        """Returns the name to offset index of the cached Packages file, fetching the file on first access"""
+        if not hasattr(self, '_cache_lazy_indexes'):
+            self._cache_lazy_indexes = {}
+        if (component, arch) in self._cache_lazy_indexes:
+            return self._cache_lazy_indexes[(component, arch)]
+
+        url = self._index_url(component, arch)
+        sha256 = self._index_checksum(component, arch)
+        if sha256 is None:
+            raise urllib.error.URLError('No SHA256 hash of "{}" in Release file'.format(url))
+        if not os.path.exists(self.cache.index_path(sha256)) and not self._patch_index(component, arch, sha256):
+            for _ in self.cache.store_index(sha256, self._iter_packages_file(component, arch, retry)):
+                pass
+        if not os.path.exists(self.cache.index_path(sha256)):
+            raise urllib.error.URLError('Could not fetch "{}"'.format(url))
+        self.cache.set_current(url, sha256)
+
+        package_class = self._package_class(arch)
+        self._cache_lazy_indexes[(component, arch)] = PackagesFileIndex(
+            self.cache.index_path(sha256), lambda stanza: package_class(stanza, self)
+        )
+        return self._cache_lazy_indexes[(component, arch)]
+
     @staticmethod
     def from_sources_list_entry(entry):
         """
@@ -333,32 +831,110 @@ class APTRepository:
     @property
     def release_file(self):
         """Returns the Release file of this repository"""
+        if hasattr(self, '_cache_release_file'):
+            return self._cache_release_file
+
         url = '/'.join(
             [self.url] +
             (['dists', self.dist] if self.dist else []) +
             ['Release']
         )
 
-        release_content = _download(url)
+        with self.metrics.timer('fetch.release'):
+            if self.cache is not None:
+                release_content = self.cache.release(url)
+            else:
+                release_content = _download(url)
 
         if release_content is None:
             raise urllib.error.URLError('No release file found under "{}"'.format(url))
 
-        return ReleaseFile(release_content)
+        self._cache_release_file = ReleaseFile(release_content)
+        return self._cache_release_file
+
+    def export_snapshot(self, path):
+        """
+        Writes the parsed packages of this repository to a binary snapshot file
+
+        The snapshot keeps the fields of `CompactBinaryPackage.FIELDS` in a deduplicated string pool together with
+        indexes of the package names and provides. It can be loaded with `import_snapshot` without parsing.
+
+        # Arguments
+        path (str): the file to write
+        """
+        rows = [
+            tuple(pack.fields.get(key) for key in CompactBinaryPackage.FIELDS)
+            for packs in self.packages.values() for pack in packs
+        ]
+        write_snapshot(path, list(CompactBinaryPackage.FIELDS), rows)
+
+    def import_snapshot(self, path):
+        """
+        Loads the packages of this repository from a snapshot file written by `export_snapshot`
+
+        The file is memory-mapped: `get`, `get_provided` and `get_binary_packages` are answered from its indexes
+        and packages are created as `SnapshotBinaryPackage` views on first access. Neither the Release file nor
+        the Packages files are downloaded.
+
+        # Arguments
+        path (str): the snapshot file
+        """
+        snapshot = PackageSnapshot(path, lambda snapshot, index: SnapshotBinaryPackage(snapshot, index, self))
+        if snapshot.fields != list(CompactBinaryPackage.FIELDS):
+            raise ValueError('"{}" was written with different package fields'.format(path))
+        for attr in ['_cache_packages', '_cache_provided_packages', '_cache_index_packages']:
+            if hasattr(self, attr):
+                delattr(self, attr)
+        self._cache_snapshot = snapshot
 
     @property
     def packages(self):
         if hasattr(self, '_cache_packages'):
             return self._cache_packages
+        if hasattr(self, '_cache_snapshot'):
+            self._set_packages([self._cache_snapshot.packages])
+            return self._cache_packages
+        self._parse_pool()
+        self._prefetch_release_file()
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            package_lists = list(executor.map(
+                lambda index: self.get_binary_packages_by_component(*index), self._indexes
+            ))
+        self._set_packages(package_lists, self._indexes)
+        return self._cache_packages
+
+    def _prefetch_release_file(self):
+        """Downloads the Release file once before the Packages files are fetched concurrently"""
+        try:
+            self.release_file
+        except urllib.error.URLError as e:
+            logging.getLogger(__name__).warning('No Release file for "{}": {}'.format(self.url, e))
+
+    @property
+    def _indexes(self):
+        """Returns the (component, architecture) pairs of all Packages files of this repository"""
+        return [(component, arch) for arch in self.architectures for component in self.components]
+
+    def _set_packages(self, package_lists, indexes=None):
+        """
+        Builds the package caches out of the parsed Packages files
+
+        # Arguments
+        package_lists (list): lists of packages
+        indexes (list): the (component, architecture) pairs of the lists, default: None if unknown
+        """
+        self._cache_index_packages = dict(zip(indexes, package_lists)) if indexes is not None else {}
+        with self.metrics.timer('index'):
+            self._index_packages(package_lists)
+
+    def _index_packages(self, package_lists):
         self._cache_packages = {}
-        for arch in self.architectures:
-            for component in self.components:
-                packs = self.get_binary_packages_by_component(component, arch)
-                for pack in packs:
-                    if pack.package in self._cache_packages:
-                        self._cache_packages[pack.package].append(pack)
-                    else:
-                        self._cache_packages[pack.package] = [pack]
+        for packs in package_lists:
+            for pack in packs:
+                if pack.package in self._cache_packages:
+                    self._cache_packages[pack.package].append(pack)
+                else:
+                    self._cache_packages[pack.package] = [pack]
 
         self._cache_provided_packages = {}
         for name, packs in self._cache_packages.items():
@@ -369,8 +945,6 @@ class APTRepository:
                     else:
                         self._cache_provided_packages[provides] = {pack}
 
-        return self._cache_packages
-
     def get_binary_packages_by_component(self, component, arch, retry=3):
         """
         Returns all binary packages of this repository for a given component
@@ -379,26 +953,307 @@ class APTRepository:
         component (str): the component to return packages for
         arch (str): the architecture to return packages for, default: 'amd64'
         """
-        url = '/'.join(
+        return self._get_index_packages(component, arch, retry)
+
+    def get_source_packages_by_component(self, component, retry=3):
+        """
+        Returns all source packages of this repository for a given component
+
+        # Arguments
+        component (str): the component to return source packages for
+        """
+        return self._get_index_packages(component, 'source', retry)
+
+    def _get_index_packages(self, component, arch, retry=3):
+        """Returns the packages of the Packages file of arch, or of the Sources file if arch is `'source'`"""
+        package_class = self._package_class(arch)
+        if self.cache is None:
+            return self._parse_packages(self._iter_packages_file(component, arch, retry), package_class=package_class)
+
+        sha256 = self._index_checksum(component, arch)
+        if sha256 is None:
+            return self._parse_packages(self._iter_packages_file(component, arch, retry), package_class=package_class)
+
+        url = self._index_url(component, arch)
+        with self.metrics.timer('cache.snapshot.load'):
+            packages = self.cache.load_snapshot(sha256, package_class, self)
+        if packages is not None:
+            logging.getLogger(__name__).info('Load snapshot of "{}"'.format(url))
+            self.metrics.count('cache.snapshot.hit')
+            self.cache.set_current(url, sha256)
+            return packages
+
+        path = self.cache.index_path(sha256)
+        if os.path.exists(path):
+            self.metrics.count('cache.index.hit')
+            packages = self._parse_packages(self.cache.iter_index(sha256), path, package_class)
+        elif self._patch_index(component, arch, sha256):
+            self.metrics.count('cache.index.patched')
+            packages = self._parse_packages(self.cache.iter_index(sha256), path, package_class)
+        else:
+            self.metrics.count('cache.index.miss')
+            packages = self._parse_packages(
+                self.cache.store_index(sha256, self._iter_packages_file(component, arch, retry)),
+                package_class=package_class
+            )
+
+        if os.path.exists(self.cache.index_path(sha256)):
+            self.cache.set_current(url, sha256)
+            if package_class is not SourcePackage:
+                for pack in packages:
+                    pack.provides
+            self.cache.save_snapshot(sha256, package_class, packages, self)
+        return packages
+
+    def _parse_packages(self, chunks, path=None, package_class=None):
+        """
+        Returns the packages of a Packages or Sources file
+
+        The stanzas are parsed here rather than on first access, so the work is done by the thread fetching the
+        index and recorded as `parse`.
+
+        # Arguments
+        chunks (iterable): the decompressed content of the Packages file in chunks
+        path (str): path to the uncompressed Packages file if it is stored on disk, default: None
+        package_class (type): the class of the packages, default: the binary package class of this repository
+        """
+        package_class = package_class or self._package_class(None)
+        if self.parse_processes and self.parse_processes > 1:
+            with self.metrics.timer('parse'):
+                packages = self._parse_packages_parallel(chunks, path, package_class)
+            self.metrics.count('parse.stanzas', len(packages))
+            return packages
+
+        # the fields of compact packages are parsed on creation, the ones of other packages on first access
+        parse_fields = package_class is not CompactBinaryPackage
+        if not self.metrics.enabled:
+            packages = [package_class(stanza, self) for stanza in _iter_stanzas(chunks)]
+            if parse_fields:
+                for pack in packages:
+                    pack.fields
+            return packages
+
+        packages = []
+        elapsed = 0.0
+        for stanza in _iter_stanzas(chunks):
+            start = time.perf_counter()
+            pack = package_class(stanza, self)
+            if parse_fields:
+                pack.fields
+            packages.append(pack)
+            elapsed += time.perf_counter() - start
+        self.metrics.timing('parse', elapsed)
+        self.metrics.count('parse.stanzas', len(packages))
+        return packages
+
+    def _parse_packages_parallel(self, chunks, path, package_class):
+        """
+        Parses a Packages or Sources file in `parse_processes` processes, see `parse_packages_file`
+
+        Unless packages are compact, the processes only send back the names and provides needed to index the
+        packages, the other fields are parsed on first access.
+        """
+        compact = package_class is CompactBinaryPackage
+        if path is not None:
+            results = parse_packages_file(path, self.parse_processes, compact, self._parse_pool())
+        else:
+            results = parse_packages_chunks(chunks, self.parse_processes, compact, self._parse_pool())
+
+        packages = []
+        if compact:
+            for values in results:
+                pack = CompactBinaryPackage.__new__(CompactBinaryPackage)
+                pack.values = values
+                pack.repository = self
+                packages.append(pack)
+        else:
+            binary = issubclass(package_class, BinaryPackage)
+            for content, name, provides in results:
+                pack = package_class(content, self)
+                pack._cache_package = name
+                if binary:
+                    pack._cache_provides = provides
+                packages.append(pack)
+        return packages
+
+    def _parse_pool(self):
+        """
+        Returns the process pool parsing the Packages files of this repository or None if it parses in threads
+
+        The pool is started on first use and shared by all Packages files, `APTSources` shares one pool between
+        its repositories. It is started before the loading threads, so the workers are not forked from them.
+        """
+        if not self.parse_processes or self.parse_processes < 2:
+            return None
+        with _parse_pool_lock:
+            if not hasattr(self, '_cache_parse_pool'):
+                self._cache_parse_pool = start_pool(self.parse_processes)
+            return self._cache_parse_pool
+
+    def _patch_index(self, component, arch, sha256):
+        """
+        Updates the previously cached Packages file to the one with the given hash by applying pdiffs
+
+        Returns True if the updated index was stored in the cache.
+
+        # Arguments
+        component (str): the component of the Packages file
+        arch (str): the architecture of the Packages file
+        sha256 (str): the SHA256 hash of the uncompressed Packages file as listed in the Release file
+        """
+        url = self._index_url(component, arch)
+        previous = self.cache.current(url)
+        if previous is None or previous == sha256 or not os.path.exists(self.cache.index_path(previous)):
+            return False
+
+        try:
+            index = PDiffIndex(_parse_stanza(_download(url + '.diff/Index')))
+            names = index.patches_from(previous) if index.current == sha256 else None
+        except (urllib.error.URLError, KeyError, ValueError):
+            return False
+        if not names:
+            return False
+
+        with open(self.cache.index_path(previous), 'rb') as fp:
+            lines = fp.read().splitlines(keepends=True)
+        patches = index.patches
+        for name in names:
+            try:
+                patch = gzip.decompress(request.urlopen(url + '.diff/' + name + '.gz').read())
+            except urllib.error.URLError:
+                return False
+            if hashlib.sha256(patch).hexdigest() != patches.get(name):
+                logging.getLogger(__name__).warning('Hash mismatch of pdiff "{}"'.format(name))
+                return False
+            try:
+                lines = apply_ed_patch(lines, patch)
+            except (ValueError, IndexError):
+                logging.getLogger(__name__).warning('Invalid pdiff "{}"'.format(name))
+                return False
+        logging.getLogger(__name__).info('Patched "{}" with {} pdiffs'.format(url, len(names)))
+
+        for _ in self.cache.store_index(sha256, lines):
+            pass
+        return os.path.exists(self.cache.index_path(sha256))
+
+    def iter_binary_packages_by_component(self, component, arch, retry=3):
+        """
+        Yields all binary packages of this repository for a given component while the Packages file is downloaded
+
+        The Packages file is decompressed and parsed incrementally, so only the current stanza and the download
+        buffers are held in memory instead of the whole index.
+
+        # Arguments
+        component (str): the component to return packages for
+        arch (str): the architecture to return packages for
+        """
+        package_class = self._package_class(arch)
+        for stanza in _iter_stanzas(self._iter_packages_file(component, arch, retry)):
+            yield package_class(stanza, self)
+
+    def _iter_index_stanzas(self, component, arch, retry=3):
+        """Yields the raw stanzas of a Packages or Sources file, read from the cache if it holds the file"""
+        sha256 = self._index_checksum(component, arch) if self.cache is not None else None
+        if sha256 is not None and os.path.exists(self.cache.index_path(sha256)):
+            return _iter_stanzas(self.cache.iter_index(sha256))
+        return _iter_stanzas(self._iter_packages_file(component, arch, retry))
+
+    def _iter_packages_file(self, component, arch, retry=3):
+        """Yields the decompressed content of a Packages or Sources file in chunks while it is downloaded"""
+        url = self._index_url(component, arch)
+        suffixes = self._compression_suffixes(component, arch)
+
+        for _ in range(retry):
+            opened = _open_compressed(url, suffixes)
+            if opened is not None:
+                break
+
+        if opened is None:
+            raise urllib.error.URLError('No {} file found under "{}"'.format(url.rsplit('/', 1)[-1], url))
+
+        return _iter_decompressed(*opened, metrics=self.metrics)
+
+    def _compression_suffixes(self, component, arch):
+        """
+        Returns the compression suffixes to try for a Packages file
+
+        Only variants listed in the Release file are tried. Without a configured preference order the smallest
+        variant comes first.
+        """
+        suffixes = self.compressions or _COMPRESSION_SUFFIXES
+        try:
+            checksums = self.release_file.checksums('SHA256') or self.release_file.checksums('MD5Sum')
+        except urllib.error.URLError:
+            return suffixes
+
+        path = self._index_path(component, arch)
+        listed = [suffix for suffix in suffixes if path + suffix in checksums]
+        if not listed:
+            return suffixes
+        if self.compressions is None:
+            listed.sort(key=lambda suffix: checksums[path + suffix][1])
+        return listed
+
+    def _index_checksum(self, component, arch):
+        """
+        Returns the SHA256 hash of the uncompressed Packages file as listed in the Release file
+
+        Returns None if the Release file or the hash is not available, the index is then fetched without the cache.
+        """
+        try:
+            checksums = self.release_file.checksums('SHA256')
+        except urllib.error.URLError:
+            return None
+        path = self._index_path(component, arch)
+        checksum = checksums.get(path)
+        return checksum[0] if checksum else None
+
+    def _component_url(self, component, arch, filename):
+        return '/'.join(
             [self.url] +
             (['dists', self.dist] if self.dist else []) +
             [component] +
-            ['binary-' + arch if arch else 'binary'] +
-            ['Packages']
+            ['source' if arch == 'source' else 'binary-' + arch if arch else 'binary'] +
+            [filename]
         )
 
-        for _ in range(retry):
-            packages_file = _download_compressed(url)
-            if packages_file is not None:
-                break
+    def _index_path(self, component, arch):
+        """Returns the path of the index of arch relative to the Release file, `source` selects the Sources file"""
+        if arch == 'source':
+            return '/'.join([component, 'source', 'Sources'])
+        return '/'.join([component, 'binary-' + arch if arch else 'binary', 'Packages'])
 
-        if packages_file is None:
-            raise urllib.error.URLError('No release file found under "{}"'.format(url))
+    def _index_url(self, component, arch):
+        return self._component_url(component, arch, 'Sources' if arch == 'source' else 'Packages')
 
-        return PackagesFile(packages_file, self).packages
+    def _package_class(self, arch):
+        if arch == 'source':
+            return SourcePackage
+        return CompactBinaryPackage if self.compact else BinaryPackage
 
     def get_binary_packages(self, name, version=None):
-        return [p for p in self.packages.get(name, []) if ((version and p.version.startswith(version)) or version is None)]
+        return [p for p in self.get(name) if ((version and p.version.startswith(version)) or version is None)]
+
+    @property
+    def source_packages(self):
+        """Returns a dictionary mapping source package names to the source packages of this repository"""
+        if hasattr(self, '_cache_source_packages'):
+            return self._cache_source_packages
+        self._parse_pool()
+        self._prefetch_release_file()
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            package_lists = list(executor.map(self.get_source_packages_by_component, self.components))
+        self._cache_index_source_packages = {(component, 'source'): packs
+                                             for component, packs in zip(self.components, package_lists)}
+        self._cache_source_packages = {}
+        for packs in package_lists:
+            for pack in packs:
+                self._cache_source_packages.setdefault(pack.package, []).append(pack)
+        return self._cache_source_packages
+
+    def get_source_packages(self, name, version=None):
+        return [p for p in self.source_packages.get(name, [])
+                if ((version and p.version.startswith(version)) or version is None)]
 
     def packages_fulfilling(self, dependency):
         names = dependency.package_name
@@ -416,23 +1271,155 @@ class APTSources:
 
     # Arguments
     repositories (list): list of APTRepository objects
+    max_workers (int): maximum number of Packages files downloaded and parsed concurrently, default: 4
+    metrics (Metrics): records timings and counters of loading, resolving and mirroring, also used by all
+        repositories without own metrics, default: disabled
     """
-    def __init__(self, repositories):
+    def __init__(self, repositories, max_workers=4, metrics=None):
         self.repositories = repositories
+        self.max_workers = max_workers
+        self.metrics = metrics or NULL_METRICS
+        for rep in repositories:
+            if not rep.metrics.enabled:
+                rep.metrics = self.metrics
+
+    def load(self):
+        """
+        Downloads and parses the Packages files of all repositories concurrently
+
+        Repositories which have already been loaded, lazy repositories and repositories with an imported snapshot
+        are skipped.
+        """
+        pending = [
+            rep for rep in self.repositories
+            if not hasattr(rep, '_cache_packages') and not hasattr(rep, '_cache_snapshot') and not rep.lazy
+        ]
+        if not pending:
+            return
+        self._share_parse_pool(pending)
+        for rep in pending:
+            rep._prefetch_release_file()
+        jobs = [(rep, index) for rep in pending for index in rep._indexes]
+        with self.metrics.timer('load'), ThreadPoolExecutor(self.max_workers) as executor:
+            results = list(executor.map(lambda job: job[0].get_binary_packages_by_component(*job[1]), jobs))
+        for rep in pending:
+            count = len(rep._indexes)
+            rep._set_packages(results[:count], rep._indexes)
+            results = results[count:]
+
+    def _share_parse_pool(self, repositories):
+        """Starts one process pool for all repositories parsing in processes which do not have a pool yet"""
+        with _parse_pool_lock:
+            parallel = [
+                rep for rep in repositories
+                if rep.parse_processes and rep.parse_processes > 1 and not hasattr(rep, '_cache_parse_pool')
+            ]
+            if not parallel:
+                return
+            if not hasattr(self, '_cache_parse_pool'):
+                self._cache_parse_pool = start_pool(max(rep.parse_processes for rep in parallel))
+            for rep in parallel:
+                rep._cache_parse_pool = self._cache_parse_pool
 
     def get(self, name):
-        return set(sum([rep.get(name) for rep in self.repositories], []))
+        self.load()
+        return {pack for rep in self.repositories for pack in rep.get(name)}
+
+    @staticmethod
+    def _snapshot_path(directory, rep):
+        return os.path.join(directory, re.sub(r'[^\w.-]+', '_', '{} {}'.format(rep.url, rep.dist)) + '.snapshot')
+
+    def export_snapshots(self, directory):
+        """
+        Writes a snapshot of every repository to directory, see `APTRepository.export_snapshot`
+
+        # Arguments
+        directory (str): the directory to write the snapshot files to
+        """
+        self.load()
+        os.makedirs(directory, exist_ok=True)
+        for rep in self.repositories:
+            rep.export_snapshot(self._snapshot_path(directory, rep))
+
+    def import_snapshots(self, directory):
+        """
+        Loads the snapshots written by `export_snapshots` into the repositories, see `APTRepository.import_snapshot`
+
+        Repositories without a snapshot in directory are loaded as usual.
+
+        # Arguments
+        directory (str): the directory containing the snapshot files
+        """
+        for rep in self.repositories:
+            path = self._snapshot_path(directory, rep)
+            if os.path.exists(path):
+                rep.import_snapshot(path)
 
     @property
     def architectures(self):
-        return set(sum([rep.architectures for rep in self.repositories], []))
+        return {arch for rep in self.repositories for arch in rep.architectures}
+
+    @property
+    def graph(self):
+        """
+        Returns the dependency graph over all repositories
+
+        The graph is built on first access. Afterwards `packages_fulfilling` and therefore dependency resolution
+        and the mirror filters use it.
+        """
+        if not hasattr(self, '_cache_graph'):
+            self.load()
+            with self.metrics.timer('graph'):
+                self._cache_graph = DependencyGraph(self)
+        return self._cache_graph
+
+    @property
+    def table(self):
+        """
+        Returns the columnar table of all packages for batch queries, see `PackageTable.select`
+
+        The table is built on first access.
+        """
+        if not hasattr(self, '_cache_table'):
+            self.load()
+            with self.metrics.timer('table'):
+                self._cache_table = PackageTable(self)
+        return self._cache_table
 
     @property
     def packages(self):
+        self.load()
         for rep in self.repositories:
             for packs in rep.packages.values():
                 yield from packs
 
+    @property
+    def source_packages(self):
+        for rep in self.repositories:
+            for packs in rep.source_packages.values():
+                yield from packs
+
+    def get_source_packages(self, name, version=None):
+        return {pack for rep in self.repositories for pack in rep.get_source_packages(name, version)}
+
+    def build_dependencies(self, source, arch=None):
+        """
+        Returns all binary packages needed to build a source package, see `SourcePackage.build_dependencies`
+
+        # Arguments
+        source (SourcePackage or str): the source package or its name, all versions are resolved for a name
+        arch (str): the architecture to build for, default: None for all architectures
+        """
+        sources = [source] if isinstance(source, SourcePackage) else self.get_source_packages(source)
+        resolver = DependencyResolver(self)
+        for pack in sources:
+            resolver.add_dependencies(pack.build_depends(arch))
+        return resolver.selected
+
     def packages_fulfilling(self, dependency):
+        if hasattr(self, '_cache_graph'):
+            yield from self._cache_graph.packages_fulfilling(dependency)
+            return
+        self.load()
         for rep in self.repositories:
             yield from rep.packages_fulfilling(dependency)
@@ -0,0 +1,240 @@
+import asyncio
+import functools
+import logging
+
+from . import APTRepository, APTSources
+from .downloader import DownloadJob
+
+
+class _Offload:
+    """Runs blocking calls in an executor, at most limit of them at the same time"""
+    def __init__(self, limit, executor):
+        self.limit = limit
+        self.executor = executor
+        self._semaphore = None
+
+    async def __call__(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        async with self._semaphore:
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor, functools.partial(func, *args)
+            )
+
+
+class AsyncAPTRepository:
+    """
+    Asyncio interface of an `APTRepository`
+
+    Downloading, decompressing and parsing the Packages files block, so they run in an executor while the event
+    loop stays responsive. At most concurrency Packages files are fetched at the same time. Concurrent calls share
+    a single load of the repository.
+
+    All other arguments are passed to `APTRepository`, the wrapped repository is available as `repository`.
+
+    # Arguments
+    concurrency (int): maximum number of Packages files fetched at the same time, default: 4
+    executor (concurrent.futures.Executor): executor running the blocking calls, default: the loop's default executor
+
+    # Examples
+    ```python
+    repository = AsyncAPTRepository('http://archive.ubuntu.com/ubuntu', 'bionic', ['main'])
+    packages = await repository.get('docker.io')
+    ```
+    """
+    def __init__(self, *args, concurrency=4, executor=None, **kwargs):
+        self.repository = args[0] if args and isinstance(args[0], APTRepository) else APTRepository(*args, **kwargs)
+        self._offload = _Offload(concurrency, executor)
+        self._loading = None
+
+    def __getattr__(self, name):
+        if name == 'repository':
+            raise AttributeError(name)
+        return getattr(self.repository, name)
+
+    async def release_file(self):
+        """Returns the Release file of this repository"""
+        return await self._offload(lambda: self.repository.release_file)
+
+    async def load(self):
+        """Downloads and parses all Packages files of this repository unless already done"""
+        if hasattr(self.repository, '_cache_packages') or self.repository.lazy:
+            return
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+        try:
+            await asyncio.shield(self._loading)
+        except BaseException:
+            if self._loading.done():
+                self._loading = None
+            raise
+
+    async def _load(self):
+        rep = self.repository
+        if hasattr(rep, '_cache_snapshot'):
+            await self._offload(lambda: rep.packages)
+            return
+        await self._offload(rep._prefetch_release_file)
+        package_lists = await asyncio.gather(*[
+            self._offload(rep.get_binary_packages_by_component, *index) for index in rep._indexes
+        ])
+        await self._offload(rep._set_packages, list(package_lists), rep._indexes)
+
+    async def packages(self):
+        """Returns a dictionary mapping package names to the packages of this repository"""
+        await self.load()
+        return self.repository.packages
+
+    async def get(self, name):
+        """Returns all packages with the given name"""
+        await self.load()
+        return await self._offload(self.repository.get, name)
+
+    async def get_provided(self, name):
+        """Returns all packages with the given name or providing it"""
+        await self.load()
+        return await self._offload(self.repository.get_provided, name)
+
+    async def get_binary_packages(self, name, version=None):
+        await self.load()
+        return await self._offload(self.repository.get_binary_packages, name, version)
+
+    async def packages_fulfilling(self, dependency):
+        await self.load()
+        return await self._offload(lambda: list(self.repository.packages_fulfilling(dependency)))
+
+    async def get_source_packages(self, name, version=None):
+        """Returns all source packages with the given name, the Sources files are fetched on first access"""
+        return await self._offload(self.repository.get_source_packages, name, version)
+
+
+class AsyncAPTSources:
+    """
+    Asyncio interface of `APTSources`
+
+    The Packages files of all repositories are fetched concurrently, at most concurrency at the same time.
+    Building the dependency graph and the package table runs in the executor as well. The wrapped sources are
+    available as `sources` and can be used synchronously once they are loaded.
+
+    # Arguments
+    repositories (list): list of `AsyncAPTRepository` or `APTRepository` objects
+    concurrency (int): maximum number of Packages files fetched at the same time, default: 4
+    executor (concurrent.futures.Executor): executor running the blocking calls, default: the loop's default executor
+    metrics (Metrics): see `APTSources`, default: disabled
+
+    # Examples
+    ```python
+    sources = AsyncAPTSources([AsyncAPTRepository(url, dist, ['main']) for dist in ['bionic', 'bionic-updates']])
+    await sources.load()
+    ```
+    """
+    def __init__(self, repositories, concurrency=4, executor=None, metrics=None):
+        self._offload = _Offload(concurrency, executor)
+        self.repositories = [
+            rep if isinstance(rep, AsyncAPTRepository) else AsyncAPTRepository(rep) for rep in repositories
+        ]
+        for rep in self.repositories:
+            rep._offload = self._offload
+        self.sources = APTSources([rep.repository for rep in self.repositories], metrics=metrics)
+
+    @property
+    def metrics(self):
+        return self.sources.metrics
+
+    async def load(self):
+        """Downloads and parses the Packages files of all repositories concurrently"""
+        with self.metrics.timer('load'):
+            await asyncio.gather(*[rep.load() for rep in self.repositories])
+
+    async def get(self, name):
+        await self.load()
+        return {pack for packs in await asyncio.gather(*[rep.get(name) for rep in self.repositories])
+                for pack in packs}
+
+    async def packages(self):
+        """Returns a list of all packages of all repositories"""
+        await self.load()
+        return list(self.sources.packages)
+
+    async def packages_fulfilling(self, dependency):
+        await self.load()
+        return await self._offload(lambda: list(self.sources.packages_fulfilling(dependency)))
+
+    async def graph(self):
+        """Returns the dependency graph over all repositories, see `APTSources.graph`"""
+        await self.load()
+        return await self._offload(lambda: self.sources.graph)
+
+    async def table(self):
+        """Returns the package table over all repositories, see `APTSources.table`"""
+        await self.load()
+        return await self._offload(lambda: self.sources.table)
+
+
+class AsyncMirrorRunner:
+    """
+    Runs an `APTDependencyMirror` from asyncio
+
+    Resolving the filters, recording downloaded files in the manifest, pruning and writing the indexes run in the
+    executor, every file is downloaded as a separate task and at most concurrency downloads run at the same time.
+
+    # Arguments
+    mirror (APTDependencyMirror): the mirror to create
+    concurrency (int): maximum number of concurrent downloads, default: 4
+    executor (concurrent.futures.Executor): executor running the blocking calls, default: the loop's default executor
+    retries (int): number of retries of failed downloads, default: 1
+
+    # Examples
+    ```python
+    mirror = APTDependencyMirror(sources.sources, '/srv/mirror')
+    mirror.add_filter(FilterAddDependency('docker.io'))
+    await AsyncMirrorRunner(mirror).run()
+    ```
+    """
+    def __init__(self, mirror, concurrency=4, executor=None, retries=1):
+        self.mirror = mirror
+        self.retries = retries
+        self._offload = _Offload(concurrency, executor)
+
+    async def run(self, dry_run=False, prune=False):
+        """
+        Mirrors all packages selected by the filters like `APTDependencyMirror.create`
+
+        Returns the number of files that failed to download.
+
+        # Arguments
+        dry_run (bool): only resolve and log what would be downloaded, default: False
+        prune (bool): remove previously mirrored packages which are no longer selected, default: False
+        """
+        mirror = self.mirror
+        with mirror.metrics.timer('mirror.resolve'):
+            await self._offload(mirror._resolve)
+        manifest, files, jobs = await self._offload(mirror._plan)
+        if dry_run:
+            return 0
+
+        await self._offload(mirror._publish_stored, manifest)
+        failed = 0
+        with mirror.metrics.timer('mirror.download'):
+            pending, done = list(jobs), 0
+            while pending:
+                retries = []
+                for task in asyncio.as_completed([asyncio.ensure_future(self._download(job)) for job in pending]):
+                    job, mirrored = await task
+                    done += 1
+                    retries += await self._offload(mirror._record, manifest, jobs, job, mirrored, done)
+                    failed += not mirrored
+                pending = retries
+        if prune:
+            await self._offload(manifest.prune, files)
+            if mirror.store is not None:
+                await self._offload(mirror.store.prune)
+        with mirror.metrics.timer('mirror.indexes'):
+            await self._offload(mirror._write_indexes, manifest)
+        await self._offload(manifest.save)
+        if mirror.metrics.enabled:
+            logging.getLogger(__name__).info('Mirror summary:\n{}'.format(mirror.metrics.summary()))
+        return failed
+
+    async def _download(self, job: DownloadJob):
+        return job, await self._offload(self.mirror.downloader.download_job, job, self.retries)
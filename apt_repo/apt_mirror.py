@@ -1,16 +1,18 @@
 import re
 import hashlib
+import json
 import logging
 import os
 import requests
-import multiprocessing
+import tempfile
+import urllib.error
 
-from . import BinaryPackageDependency
-
-
-def mkdirs_if_not_exist(filename):
-    if not os.path.exists(os.path.dirname(filename)):
-        os.makedirs(os.path.dirname(filename))
+from . import (
+    BinaryPackage, BinaryPackageDependency, CompactBinaryPackage, DependencyResolver, DependencySolver, SourcePackage
+)
+from .downloader import Downloader, DownloadJob, mkdirs_if_not_exist
+from .publish import RELEASE_FIELDS, IndexWriter, write_release
+from .version import version_key
 
 
 def shafile(filename, alg='sha1'):
@@ -39,13 +41,111 @@ def _topath(url):
     return re.sub(r'https?://', '', url)
 
 
+class MirrorManifest:
+    """
+    Record of the files mirrored to a location
+
+    For each file the path relative to the mirror location, its size, its checksum and its modification time are
+    stored in a JSON file. A file whose record matches the expected size and checksum and whose size and
+    modification time on disk are unchanged does not need to be checked again.
+
+    # Arguments
+    location (str): the mirror location
+    """
+    FILENAME = '.apt-repo-manifest.json'
+
+    def __init__(self, location):
+        self.location = location
+        self.path = os.path.join(location, self.FILENAME)
+        try:
+            with open(self.path) as fp:
+                self.files = json.load(fp)
+        except (OSError, ValueError):
+            self.files = {}
+
+    def unchanged(self, path, size, checksum):
+        """
+        Checks if the file at path is recorded with the given size and checksum and was not modified since
+
+        # Arguments
+        path (str): path relative to the mirror location
+        size (int): the expected size
+        checksum (tuple): `hashlib` algorithm and expected hex digest
+        """
+        entry = self.files.get(path)
+        if entry is None or entry['size'] != size or entry['checksum'] != ':'.join(checksum):
+            return False
+        try:
+            stat = os.stat(os.path.join(self.location, path))
+        except OSError:
+            return False
+        return stat.st_size == size and stat.st_mtime == entry['mtime']
+
+    def add(self, path, size, checksum):
+        """Records the file at path, which must exist"""
+        stat = os.stat(os.path.join(self.location, path))
+        self.files[path] = {'size': size, 'checksum': ':'.join(checksum), 'mtime': stat.st_mtime}
+
+    def prune(self, keep):
+        """
+        Removes all recorded files not in keep from disk and from the manifest
+
+        # Arguments
+        keep (set): paths relative to the mirror location to keep
+        """
+        for path in sorted(set(self.files) - set(keep)):
+            logging.getLogger(__name__).info('Remove "{}"'.format(path))
+            try:
+                os.remove(os.path.join(self.location, path))
+            except FileNotFoundError:
+                pass
+            del self.files[path]
+
+    def save(self):
+        mkdirs_if_not_exist(self.path)
+        fd, tmp = tempfile.mkstemp(dir=self.location, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(self.files, fp, indent=0, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
 class APTDependencyMirror:
+    """
+    Class that mirrors packages of APT repositories selected by filters
+
+    Filters may select binary packages as well as source packages, for which the .dsc, the original tarballs and
+    the Debian changes are mirrored. Files shared by several source packages are downloaded once.
+
+    The mirror gets its own Packages and Sources files, compressed with gzip and xz, listing only the mirrored
+    packages and a Release file with their sizes and hashes, so clients neither download the full upstream indexes
+    nor request packages which were not mirrored. The Release file is not signed, clients have to trust the mirror
+    or it has to be signed afterwards.
+
+    With a content store, files are looked up by their SHA256 hash before anything is requested: a file stored
+    for another repository or URL is linked into place instead of downloaded, and files with the same content
+    under several paths are downloaded only once.
+
+    # Arguments
+    sources (APTSources): the repositories to mirror from
+    location (str): the directory to mirror to
+    downloader (Downloader): the downloader used for all files, default: `Downloader()`
+    metrics (Metrics): records timings and counters of resolving and downloading, also used by the downloader if
+        it has no own metrics, default: the metrics of sources
+    store (ContentStore): content-addressed store the mirrored files are published from, default: None
+    """
 
-    def __init__(self, sources, location):
+    def __init__(self, sources, location, downloader=None, metrics=None, store=None):
         self.sources = sources
         self.location = location
         self.packages_to_mirror = set()
         self.filters = []
+        self.metrics = metrics or sources.metrics
+        self.downloader = downloader or Downloader(metrics=self.metrics)
+        if not self.downloader.metrics.enabled:
+            self.downloader.metrics = self.metrics
+        self.store = store
+        self._stored = []
+        self._duplicates = {}
 
     def add_filter(self, thefilter):
         logging.getLogger(__name__).info('Add Filter {}.'.format(thefilter))
@@ -56,68 +156,321 @@ class APTDependencyMirror:
         for filter in self.filters:
             self.packages_to_mirror |= set(filter.addfrom(self))
 
-    def create(self, processes=4, dry_run=False):
-        self._resolve()
-        logging.getLogger(__name__).info('Download {} packages of approx {:,}kb size.'.format(
-            len(self.packages_to_mirror),
-            sum((p.size for p in self.packages_to_mirror)) // 1024,
-        ))
+    def create(self, processes=4, dry_run=False, prune=False):
+        """
+        Mirrors all packages selected by the filters
+
+        Files recorded in the mirror's manifest which are unchanged are skipped, so repeated runs only transfer
+        new and changed packages. If metrics are enabled, a summary of them is logged at the end.
+
+        # Arguments
+        processes (int): number of concurrent downloads over all hosts, default: 4
+        dry_run (bool): only resolve and log what would be downloaded, default: False
+        prune (bool): remove previously mirrored packages which are no longer selected, default: False
+        """
+        with self.metrics.timer('mirror.resolve'):
+            self._resolve()
+        manifest, files, jobs = self._plan()
         if not dry_run:
-            self._mirror_metafiles()
-            with multiprocessing.Pool(processes) as pool:
-                pool.map(self._mirror_package, self.packages_to_mirror)
-
-    def _mirror_metafiles(self):
+            self._publish_stored(manifest)
+            with self.metrics.timer('mirror.download'):
+                pending, done = list(jobs), 0
+                while pending:
+                    retries = []
+                    for job, mirrored in self.downloader.download_all(pending, processes):
+                        done += 1
+                        retries += self._record(manifest, jobs, job, mirrored, done)
+                    pending = retries
+            if prune:
+                manifest.prune(files)
+                if self.store is not None:
+                    self.store.prune()
+            with self.metrics.timer('mirror.indexes'):
+                self._write_indexes(manifest)
+            manifest.save()
+        if self.metrics.enabled:
+            logging.getLogger(__name__).info('Mirror summary:\n{}'.format(self.metrics.summary()))
+
+    def _plan(self):
+        """
+        Compares the files of the resolved packages with the manifest
+
+        Returns the manifest, a dictionary mapping the paths of all selected files to their packages and a
+        dictionary mapping the download jobs of new and changed files to their packages.
+
+        With a content store, files found in the store are kept for `_publish_stored` and files with the same hash
+        as another download wait for it instead of getting a job of their own.
+        """
+        manifest = MirrorManifest(self.location)
+        files = {}
+        jobs = {}
+        self._stored = []
+        self._duplicates = {}
+        downloads = {}
+        for package in self.packages_to_mirror:
+            for job in self._package_jobs(package):
+                path = os.path.relpath(job.path, self.location)
+                if path in files:
+                    continue
+                files[path] = package
+                if manifest.unchanged(path, job.size, job.checksum):
+                    continue
+                sha256 = self._sha256(package, job) if self.store is not None else None
+                if sha256 is None:
+                    jobs[job] = package
+                elif sha256 in self.store:
+                    self._stored.append((sha256, job))
+                elif sha256 in downloads:
+                    self._duplicates.setdefault(downloads[sha256], []).append((job, package))
+                else:
+                    downloads[sha256] = job
+                    jobs[job] = package
+        self.metrics.count('mirror.unchanged', len(files) - len(jobs) - len(self._stored) -
+                           sum(len(duplicates) for duplicates in self._duplicates.values()))
+        logging.getLogger(__name__).info('Download {} of {} files of approx {:,}kb size.'.format(
+            len(jobs),
+            len(files),
+            sum((job.size for job in jobs)) // 1024,
+        ))
+        return manifest, files, jobs
+
+    def _publish_stored(self, manifest):
+        """Links the files planned by `_plan` which are already in the content store into place"""
+        for sha256, job in self._stored:
+            if self.store.publish(sha256, job.path):
+                manifest.add(os.path.relpath(job.path, self.location), job.size, job.checksum)
+                self.metrics.count('mirror.stored')
+        self._stored = []
+
+    def _record(self, manifest, jobs, job, mirrored, done):
+        """
+        Records the result of a finished download job in the manifest and the content store
+
+        Returns the jobs to run additionally: if the download failed, the first file with the same hash waiting for
+        it is downloaded from its own URL instead, the others wait for that download.
+        """
+        duplicates = self._duplicates.pop(job, [])
+        if mirrored:
+            manifest.add(os.path.relpath(job.path, self.location), job.size, job.checksum)
+            sha256 = self._sha256(jobs[job], job) if self.store is not None else None
+            if sha256 is not None:
+                self.store.add(sha256, job.path)
+                for duplicate, package in duplicates:
+                    self.store.publish(sha256, duplicate.path)
+                    manifest.add(os.path.relpath(duplicate.path, self.location), duplicate.size, duplicate.checksum)
+                    self.metrics.count('mirror.stored')
+        self.metrics.count('mirror.downloaded' if mirrored else 'mirror.failed')
+        logging.getLogger(__name__).info('Mirrored {} of {} files.'.format(done, len(jobs)))
+
+        if mirrored or not duplicates:
+            return []
+        (retry, package), waiting = duplicates[0], duplicates[1:]
+        logging.getLogger(__name__).warning('Download "{}" directly after "{}" failed'.format(retry.url, job.url))
+        jobs[retry] = package
+        if waiting:
+            self._duplicates[retry] = waiting
+        return [retry]
+
+    @staticmethod
+    def _sha256(package, job):
+        """Returns the SHA256 hash of the file of job or None if the index does not list it"""
+        if job.checksum is not None and job.checksum[0] == 'sha256':
+            return job.checksum[1]
+        if isinstance(package, SourcePackage):
+            return None
+        try:
+            return package.sha256
+        except KeyError:
+            return None
+
+    def _package_path(self, package):
+        """Returns the path of package relative to the mirror location"""
+        return os.path.join(_topath(package.repository.url), *package.filename.split('/'))
+
+    def _write_indexes(self, manifest):
+        """
+        Writes Packages, Sources and Release files listing the selected packages whose files were all mirrored
+
+        Every Packages file of the repositories is written, empty if no package of it was selected, so clients
+        configured with all components find their indexes. Sources files are only written for repositories with
+        selected source packages.
+        """
+        repositories = {}
         for repo in self.sources.repositories:
-            for fil in ['Release', 'Release.gpg', 'InRelease']:
-                download(
-                    '/'.join([repo.url, 'dists', repo.dist, fil]),
-                    os.path.join(self.location, _topath(repo.url), 'dists', repo.dist, fil)
-                )
-            for component in repo.components:
-                for architecture in repo.architectures:
-                    for fil in ['Packages', 'Packages.gz', 'Release']:
-                        download(
-                            '/'.join([repo.url, 'dists', repo.dist, component, 'binary-' + architecture, fil]),
-                            os.path.join(self.location, _topath(repo.url), 'dists', repo.dist, component, 'binary-' + architecture, fil)
-                        )
-
-    def _mirror_package(self, package, retry_count=1):
-        download_url = package.repository.url + '/' + package.filename
-        filename = os.path.join(self.location, _topath(package.repository.url), *package.filename.split('/'))
-
-        logging.getLogger(__name__).info('Download {} from "{}" to "{}"'.format(package, download_url, filename))
-
-        if not os.path.exists(filename):
-            download(download_url, filename)
-
-        if shafile(filename) != package.sha1:
-            if retry_count > 0:
-                os.remove(filename)
-                self._mirror_package(package, retry_count - 1)
+            repositories.setdefault((repo.url, repo.dist), []).append(repo)
+        packages = {}
+        for package in self.packages_to_mirror:
+            if all(os.path.relpath(job.path, self.location) in manifest.files for job in self._package_jobs(package)):
+                packages.setdefault((package.repository.url, package.repository.dist), []).append(package)
+
+        for (url, dist), repos in repositories.items():
+            base = os.path.join(self.location, _topath(url), *(['dists', dist] if dist else []))
+            indexes = self._indexes(repos, packages.get((url, dist), []))
+            files = []
+            for (component, arch), packs in sorted(indexes.items()):
+                relative = repos[0]._index_path(component, arch)
+                packs = sorted(packs, key=lambda pack: (pack.package, version_key(pack.version)))
+                stanzas = self._stanzas(component, arch, packs)
+                with IndexWriter(os.path.join(base, *relative.split('/'))) as index:
+                    for stanza in stanzas:
+                        index.write(stanza)
+                files += [(relative + suffix, size, md5, sha256) for suffix, size, md5, sha256 in index.files]
+                self.metrics.count('mirror.indexed', index.count)
+
+            try:
+                upstream = repos[0].release_file.fields
+            except urllib.error.URLError:
+                upstream = {}
+            fields = {key: upstream[key] for key in RELEASE_FIELDS if key in upstream}
+            fields.setdefault('Suite', dist)
+            fields['Architectures'] = ' '.join(sorted({arch for component, arch in indexes if arch != 'source'}))
+            fields['Components'] = ' '.join(sorted({component for component, arch in indexes}))
+            write_release(os.path.join(base, 'Release'), fields, files)
+            # signatures of the upstream Release file mirrored by earlier versions would not match
+            for name in ['InRelease', 'Release.gpg']:
+                if os.path.exists(os.path.join(base, name)):
+                    os.remove(os.path.join(base, name))
+            logging.getLogger(__name__).info('Wrote {} indexes of "{}"'.format(len(indexes), base))
+
+    @staticmethod
+    def _stanzas(component, arch, packages):
+        """
+        Returns the stanzas of packages for the index of component and arch
+
+        Compact packages only keep the fields of `CompactBinaryPackage.FIELDS`, so their complete stanzas are read
+        from the upstream index again. If that fails, the kept fields are published with a warning.
+        """
+        compact = [pack for pack in packages if isinstance(pack, CompactBinaryPackage)]
+        if not compact:
+            return [pack.content for pack in packages]
+
+        def key(pack):
+            return pack.package, pack.version, pack.architecture
+
+        keys = {key(pack) for pack in compact}
+        stanzas = {}
+        try:
+            for stanza in compact[0].repository._iter_index_stanzas(component, arch):
+                stanza_key = key(BinaryPackage(stanza, None))
+                if stanza_key in keys:
+                    stanzas[stanza_key] = stanza
+        except urllib.error.URLError as e:
+            logging.getLogger(__name__).warning('Failed to read the index of {} {}: {}'.format(component, arch, e))
+        missing = len(keys - set(stanzas))
+        if missing:
+            logging.getLogger(__name__).warning(
+                'Publishing only the kept fields of {} compact packages of {} {}'.format(missing, component, arch)
+            )
+        return [
+            stanzas.get(key(pack), pack.content) if isinstance(pack, CompactBinaryPackage) else pack.content
+            for pack in packages
+        ]
+
+    @staticmethod
+    def _indexes(repos, packages):
+        """
+        Returns a dictionary mapping the (component, architecture) pairs of the indexes of repos to the packages
+        listed in them, the architecture of Sources files is `'source'`
+
+        Packages of repositories loaded without knowing the index of each package, e.g. from a snapshot, are
+        placed by the component of their pool path and by their architecture. Packages of architecture `all` are
+        listed in the Packages files of all architectures.
+        """
+        indexes = {(component, arch): [] for repo in repos for component in repo.components
+                   for arch in repo.architectures}
+        if any(isinstance(pack, SourcePackage) for pack in packages):
+            indexes.update({(component, 'source'): [] for repo in repos for component in repo.components})
+
+        selected = set(packages)
+        located = {}
+        for repo in repos:
+            for attr in ['_cache_index_packages', '_cache_index_source_packages']:
+                for index, packs in getattr(repo, attr, {}).items():
+                    for pack in packs:
+                        if pack in selected:
+                            located.setdefault(pack, []).append(index)
+
+        listed = set()
+        for pack in packages:
+            source = isinstance(pack, SourcePackage)
+            if pack in located:
+                candidates = located[pack]
             else:
-                logging.getLogger(__name__).critical('Corrupt file "{}"'.format(filename))
+                path = pack.directory if source else pack.filename
+                component = path.split('/')[1] if path.startswith('pool/') and path.count('/') > 1 else None
+                component = component if component in pack.repository.components else pack.repository.components[0]
+                candidates = [(component, 'source')] if source else [(component, pack.architecture)]
+            for component, arch in candidates:
+                arches = pack.repository.architectures if not source and pack.architecture == 'all' else [arch]
+                for arch in arches:
+                    key = (component, arch, pack.package, pack.version, 'source' if source else pack.architecture)
+                    if key not in listed:
+                        listed.add(key)
+                        indexes.setdefault((component, arch), []).append(pack)
+        return indexes
+
+    def _package_job(self, package):
+        """Returns the download job of package"""
+        return DownloadJob(
+            package.repository.url + '/' + package.filename,
+            os.path.join(self.location, self._package_path(package)),
+            package.size,
+            package.checksum,
+        )
+
+    def _package_jobs(self, package):
+        """Returns the download jobs of all files of a binary or source package"""
+        if not isinstance(package, SourcePackage):
+            return [self._package_job(package)]
+        url = _topath(package.repository.url)
+        return [
+            DownloadJob(
+                package.repository.url + '/' + filename,
+                os.path.join(self.location, url, *filename.split('/')),
+                size,
+                checksum,
+            )
+            for filename, size, checksum in package.files
+        ]
+
+
+class FilterAddQuery:
+    """
+    Filter adding all packages matching the given criteria, see `PackageTable.select` for the possible criteria.
+
+    # Examples
+    ```python
+    FilterAddQuery(url='http://archive.ubuntu.com/ubuntu', component='main', priority=['required', 'important'])
+    ```
+    """
+
+    def __init__(self, **criteria):
+        self.criteria = criteria
 
+    def addfrom(self, mirror: APTDependencyMirror):
+        packs = mirror.sources.table.select(**self.criteria)
+        logging.getLogger(__name__).debug('Adding {} packages matching {}'.format(len(packs), self))
+        return packs
+
+    def __str__(self):
+        return '<FilterAddQuery {}>'.format(
+            ' '.join('{}={}'.format(key, value) for key, value in sorted(self.criteria.items()))
+        )
 
-class FilterAddArchitectureFromUrl:
+    def __repr__(self):
+        return str(self)
+
+
+class FilterAddArchitectureFromUrl(FilterAddQuery):
     """
     Filter adding all packages of given architecture and url.
     """
 
     def __init__(self, url, arch):
+        super().__init__(url=url, architecture=arch)
         self.arch = arch
         self.url = url
 
-    def addfrom(self, mirror: APTDependencyMirror):
-        for rep in mirror.sources.repositories:
-            if rep.url != self.url:
-                continue
-            for packs in rep.packages.values():
-                for pack in packs:
-                    if pack.architecture == self.arch:
-                        logging.getLogger(__name__).debug('Adding package "{}"'.format(pack))
-                        yield pack
-
     def __str__(self):
         return '<FilterAddArchitectureFromUrl {} {}>'.format(self.url, self.arch)
 
@@ -129,15 +482,34 @@ class FilterAddDependency:
     """
     Filter adding all packages fulfilling given dependency and recursively all of their dependencies.
     This gives the minimal set of packages needed for installing this package.
+
+    With solve, a `DependencySolver` picks one installable package per dependency instead of adding all versions
+    and alternatives, which gives a much smaller set.
+
+    # Arguments
+    dependency (str): the dependency, e.g. `'docker.io (>= 17.03)'`
+    solve (bool): select an installable set with `DependencySolver`, default: False
+    recommends (bool): include recommended packages when solving, default: False
+    priorities (dict): pin priorities of repositories when solving, see `DependencySolver`, default: None
+    architecture (str): the native architecture when solving, see `DependencySolver`, default: None
     """
 
-    def __init__(self, dependency):
+    def __init__(self, dependency, solve=False, recommends=False, priorities=None, architecture=None):
         self.dependency = BinaryPackageDependency(dependency)
+        self.solve = solve
+        self.recommends = recommends
+        self.priorities = priorities
+        self.architecture = architecture
 
     def addfrom(self, mirror):
-        packs = set()
-        for pack in mirror.sources.packages_fulfilling(self.dependency):
-            pack.dependencies(mirror.sources, packs)
+        if self.solve:
+            solver = DependencySolver(mirror.sources, self.architecture, self.recommends, self.priorities)
+            packs = solver.add_dependencies([self.dependency])
+        else:
+            resolver = DependencyResolver(mirror.sources)
+            for pack in mirror.sources.packages_fulfilling(self.dependency):
+                resolver.add(pack)
+            packs = resolver.selected
         for pack in packs:
             logging.getLogger(__name__).debug('Adding package "{}" as dependency of {}'.format(pack, self.dependency))
         return packs
@@ -147,3 +519,48 @@ class FilterAddDependency:
 
     def __repr__(self):
         return str(self)
+
+
+class FilterAddSource:
+    """
+    Filter adding the source packages with given name, and optionally version, of all repositories.
+    """
+
+    def __init__(self, name, version=None):
+        self.name = name
+        self.version = version
+
+    def addfrom(self, mirror):
+        packs = mirror.sources.get_source_packages(self.name, self.version)
+        if not packs:
+            logging.getLogger(__name__).warning('No source package found matching "{}"'.format(self.name))
+        return packs
+
+    def __str__(self):
+        return '<FilterAddSource {}{}>'.format(self.name, ' ' + self.version if self.version else '')
+
+    def __repr__(self):
+        return str(self)
+
+
+class FilterAddBuildDependencies:
+    """
+    Filter adding all binary packages needed to build the source packages with given name, i.e. the packages
+    fulfilling their build dependencies and recursively all of their dependencies.
+    """
+
+    def __init__(self, name, arch=None):
+        self.name = name
+        self.arch = arch
+
+    def addfrom(self, mirror):
+        packs = mirror.sources.build_dependencies(self.name, self.arch)
+        for pack in packs:
+            logging.getLogger(__name__).debug('Adding package "{}" as build dependency of {}'.format(pack, self.name))
+        return packs
+
+    def __str__(self):
+        return '<FilterAddBuildDependencies {}{}>'.format(self.name, ' ' + self.arch if self.arch else '')
+
+    def __repr__(self):
+        return str(self)
@@ -0,0 +1,209 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import re
+import tempfile
+import urllib.error
+import urllib.request as request
+
+
+def _atomic_write(path, data):
+    """
+    Writes data to a file by writing a temporary file and renaming it
+
+    # Arguments
+    path (str): path of the file
+    data (bytes): content of the file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class IndexCache:
+    """
+    Persistent on-disk cache for Release and Packages files
+
+    Release files are revalidated with conditional requests (`If-None-Match`/`If-Modified-Since`).
+    Decompressed Packages files and pre-parsed snapshots of their packages are stored under the SHA256 hash the
+    Release file lists for them, so a cached index is valid exactly as long as the Release file references it.
+    The hash of the index last loaded from each URL is recorded, so it can be updated with pdiffs.
+
+    # Arguments
+    directory (str): the cache directory
+
+    # Examples
+    ```python
+    cache = IndexCache(os.path.expanduser('~/.cache/apt-repo'))
+    APTRepository('http://archive.ubuntu.com/ubuntu', 'bionic', ['main'], cache=cache)
+    ```
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _release_path(self, url):
+        return os.path.join(self.directory, 'releases', *re.sub(r'https?://', '', url).split('/'))
+
+    def index_path(self, sha256):
+        """Returns the path of the decompressed index with the given SHA256 hash"""
+        return os.path.join(self.directory, 'indexes', sha256)
+
+    def _current_path(self, url):
+        return os.path.join(self.directory, 'current', *re.sub(r'https?://', '', url).split('/'))
+
+    def current(self, url):
+        """
+        Returns the SHA256 hash of the index most recently loaded from url or `None`
+
+        # Arguments
+        url (str): URL to the index without compression suffix
+        """
+        try:
+            with open(self._current_path(url)) as fp:
+                return fp.read().strip()
+        except OSError:
+            return None
+
+    def set_current(self, url, sha256):
+        """
+        Records the SHA256 hash of the index most recently loaded from url
+
+        # Arguments
+        url (str): URL to the index without compression suffix
+        sha256 (str): the SHA256 hash of the index
+        """
+        if self.current(url) != sha256:
+            _atomic_write(self._current_path(url), sha256.encode('utf-8'))
+
+    def _snapshot_path(self, sha256, package_class):
+        return os.path.join(self.directory, 'snapshots', '{}.{}.pickle'.format(sha256, package_class.__name__))
+
+    def release(self, url):
+        """
+        Returns the content of a Release file, downloading it only if it changed upstream
+
+        # Arguments
+        url (str): URL to the Release file
+        """
+        path = self._release_path(url)
+        try:
+            with open(path + '.json') as fp:
+                validators = json.load(fp)
+        except (OSError, ValueError):
+            validators = {}
+
+        headers = {}
+        if validators.get('ETag') and os.path.exists(path):
+            headers['If-None-Match'] = validators['ETag']
+        if validators.get('Last-Modified') and os.path.exists(path):
+            headers['If-Modified-Since'] = validators['Last-Modified']
+
+        try:
+            response = request.urlopen(request.Request(url, headers=headers))
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                raise
+            logging.getLogger(__name__).info('Not modified "{}"'.format(url))
+            with open(path, 'rb') as fp:
+                return fp.read().decode('utf-8')
+
+        logging.getLogger(__name__).info('Download "{}"'.format(url))
+        content = response.read()
+        _atomic_write(path, content)
+        _atomic_write(path + '.json', json.dumps({
+            key: response.headers[key] for key in ['ETag', 'Last-Modified'] if key in response.headers
+        }).encode('utf-8'))
+        return content.decode('utf-8')
+
+    def iter_index(self, sha256, chunk_size=2**16):
+        """
+        Yields the content of a cached decompressed index in chunks
+
+        # Arguments
+        sha256 (str): the SHA256 hash of the index
+        chunk_size (int): number of bytes to read at once
+        """
+        with open(self.index_path(sha256), 'rb') as fp:
+            chunk = fp.read(chunk_size)
+            while chunk:
+                yield chunk
+                chunk = fp.read(chunk_size)
+
+    def store_index(self, sha256, chunks):
+        """
+        Passes through the chunks of a decompressed index while storing them in the cache
+
+        The index is only stored if its content matches the expected hash.
+
+        # Arguments
+        sha256 (str): the expected SHA256 hash of the index
+        chunks (iterable): the decompressed chunks of the index
+        """
+        path = self.index_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        sha = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    fp.write(chunk)
+                    yield chunk
+            if sha.hexdigest() == sha256:
+                os.replace(tmp, path)
+            else:
+                logging.getLogger(__name__).warning('Hash mismatch of index, expected {} got {}'.format(
+                    sha256, sha.hexdigest()
+                ))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def load_snapshot(self, sha256, package_class, repository):
+        """
+        Returns the pre-parsed packages of an index or `None` if there is no snapshot
+
+        # Arguments
+        sha256 (str): the SHA256 hash of the index
+        package_class (type): the class of the stored packages
+        repository (APTRepository): the repository the packages are bound to
+        """
+        try:
+            fp = open(self._snapshot_path(sha256, package_class), 'rb')
+        except OSError:
+            return None
+        with fp:
+            unpickler = pickle.Unpickler(fp)
+            unpickler.persistent_load = lambda pid: repository
+            try:
+                return unpickler.load()
+            except Exception as e:
+                logging.getLogger(__name__).warning('Ignoring broken snapshot of {}: {}'.format(sha256, e))
+                return None
+
+    def save_snapshot(self, sha256, package_class, packages, repository):
+        """
+        Stores pre-parsed packages of an index
+
+        The reference to the repository is not stored, it is replaced on load.
+
+        # Arguments
+        sha256 (str): the SHA256 hash of the index
+        package_class (type): the class of the stored packages
+        packages (list): the parsed packages
+        repository (APTRepository): the repository the packages are bound to
+        """
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: 'repository' if obj is repository else None
+        pickler.dump(packages)
+        _atomic_write(self._snapshot_path(sha256, package_class), buffer.getvalue())
@@ -0,0 +1,209 @@
+import collections
+import hashlib
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from .metrics import NULL_METRICS
+
+
+DownloadJob = collections.namedtuple('DownloadJob', ['url', 'path', 'size', 'checksum'])
+DownloadJob.__doc__ = """
+A single file to download
+
+# Arguments
+url (str): URL to download from
+path (str): path to write the file to
+size (int): the expected size of the file or `None`
+checksum (tuple): `hashlib` algorithm and expected hex digest of the file or `None`
+"""
+
+
+def mkdirs_if_not_exist(filename):
+    if not os.path.exists(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+
+class Downloader:
+    """
+    Downloads files over pooled HTTP connections
+
+    Each host gets its own `requests.Session`, so connections are kept alive and reused, and a limit of concurrent
+    downloads. Files are written with large buffers and partial files are resumed with HTTP range requests.
+
+    The sessions are not pickled, so a downloader can be passed to other processes.
+
+    # Arguments
+    connections_per_host (int): maximum number of concurrent downloads from one host, default: 4
+    chunk_size (int): size of the read and write buffers in bytes, default: 1 MiB
+    timeout (float): timeout of connecting and reading in seconds, default: 60
+    metrics (Metrics): records the transfer of every download and the `hash` timing, not pickled, default: disabled
+    """
+    def __init__(self, connections_per_host=4, chunk_size=2**20, timeout=60, metrics=None):
+        self.connections_per_host = connections_per_host
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.metrics = metrics or NULL_METRICS
+        self._init_pools()
+
+    def _init_pools(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._slots = {}
+
+    def __getstate__(self):
+        return {'connections_per_host': self.connections_per_host, 'chunk_size': self.chunk_size,
+                'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.metrics = NULL_METRICS
+        self._init_pools()
+
+    def _pool(self, url):
+        """Returns the session and the concurrency limit of the host of url"""
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.connections_per_host
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+                self._slots[host] = threading.BoundedSemaphore(self.connections_per_host)
+            return self._sessions[host], self._slots[host]
+
+    def download(self, remote, local, size=None, checksum=None):
+        """
+        Downloads a file
+
+        The file is written to `local + '.part'` and only renamed to `local` once it is complete and its checksum,
+        computed while downloading, matches. If the expected size is known, an existing file of this size is kept
+        if it also matches the checksum, otherwise it is downloaded again, and a partial file is resumed. Returns
+        True if the file was downloaded or already present.
+
+        Network and file system errors are logged and return False, the partial file is kept for the next attempt.
+
+        # Arguments
+        remote (str): URL to download from
+        local (str): path to write the file to
+        size (int): the expected size of the file, default: None
+        checksum (tuple): `hashlib` algorithm and expected hex digest of the file, default: None
+        """
+        if size is not None and os.path.exists(local) and os.path.getsize(local) == size:
+            if checksum is None or self._hash_file(local, checksum[0]) == checksum[1]:
+                return True
+            logging.getLogger(__name__).warning('Checksum mismatch of existing file "{}"'.format(local))
+
+        partial = local + '.part'
+        offset = os.path.getsize(partial) if size is not None and os.path.exists(partial) else 0
+        if size is not None and offset > size:
+            offset = 0
+
+        mkdirs_if_not_exist(local)
+        session, slot = self._pool(remote)
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+        sha = hashlib.new(checksum[0]) if checksum else None
+        with slot:
+            logging.getLogger(__name__).info('Download "{}" -> "{}"{}'.format(
+                remote, local, ' from byte {}'.format(offset) if offset else ''
+            ))
+            try:
+                response = session.get(remote, headers=headers, stream=True, timeout=self.timeout)
+                if response.status_code == requests.codes['requested_range_not_satisfiable']:
+                    response.close()
+                    response = session.get(remote, stream=True, timeout=self.timeout)
+                with response:
+                    if response.status_code not in (requests.codes['ok'], requests.codes['partial_content']):
+                        logging.getLogger(__name__).warning('Response {} for URL: "{}"'.format(
+                            response.status_code, remote
+                        ))
+                        return False
+                    resume = response.status_code == requests.codes['partial_content']
+                    if resume and sha:
+                        with open(partial, 'rb') as fp:
+                            for block in iter(lambda: fp.read(self.chunk_size), b''):
+                                sha.update(block)
+                    with open(partial, 'ab' if resume else 'wb', buffering=self.chunk_size) as fp:
+                        if self.metrics.enabled:
+                            self._write_measured(remote, response, fp, sha)
+                        else:
+                            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                                if sha:
+                                    sha.update(chunk)
+                                fp.write(chunk)
+            except (requests.RequestException, OSError) as e:
+                logging.getLogger(__name__).warning('Failed to download "{}": {}'.format(remote, e))
+                return False
+
+        if sha and sha.hexdigest() != checksum[1]:
+            logging.getLogger(__name__).warning('Checksum mismatch for URL: "{}"'.format(remote))
+            os.remove(partial)
+            return False
+        os.replace(partial, local)
+        return True
+
+    def _hash_file(self, path, algorithm):
+        """Returns the hex digest of the file at path"""
+        sha = hashlib.new(algorithm)
+        with self.metrics.timer('hash'), open(path, 'rb') as fp:
+            for block in iter(lambda: fp.read(self.chunk_size), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def _write_measured(self, remote, response, fp, sha):
+        """Writes the content of response to fp like `download`, but records the transfer and hashing time"""
+        size = 0
+        hashing = 0.0
+        start = time.perf_counter()
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            size += len(chunk)
+            if sha:
+                hash_start = time.perf_counter()
+                sha.update(chunk)
+                hashing += time.perf_counter() - hash_start
+            fp.write(chunk)
+        self.metrics.transfer(remote, size, time.perf_counter() - start - hashing)
+        self.metrics.count('download.bytes', size)
+        if sha:
+            self.metrics.timing('hash', hashing)
+
+    def download_job(self, job, retries=1):
+        """
+        Runs a `DownloadJob`, retrying it if it fails
+
+        Returns True if the file was downloaded or already present.
+
+        # Arguments
+        job (DownloadJob): the download to run
+        retries (int): number of retries if the download fails, default: 1
+        """
+        for _ in range(retries + 1):
+            if self.download(*job):
+                return True
+        logging.getLogger(__name__).critical('Failed to download "{}" to "{}"'.format(job.url, job.path))
+        return False
+
+    def download_all(self, jobs, max_workers=4, retries=1):
+        """
+        Downloads files concurrently in threads
+
+        Only the small `DownloadJob` tuples are handed to the worker threads. Results are yielded as tuples of the
+        job and whether it succeeded as soon as each download finishes, so callers can report progress.
+
+        # Arguments
+        jobs (iterable): the `DownloadJob`s to run
+        max_workers (int): maximum number of concurrent downloads over all hosts, default: 4
+        retries (int): number of retries of failed downloads, default: 1
+        """
+        with ThreadPoolExecutor(max_workers) as executor:
+            futures = {executor.submit(self.download_job, job, retries): job for job in jobs}
+            for future in as_completed(futures):
+                yield futures.pop(future), future.result()
@@ -0,0 +1,100 @@
+from .resolver import DependencyResolver
+
+
+class DependencyGraph:
+    """
+    Dependency graph over all packages of a collection of repositories
+
+    The graph is built once: every package is a node, its parsed `Depends` and `Pre-Depends` are edges to the
+    packages fulfilling them and package names and provides are indexed across all repositories. Afterwards
+    `packages_fulfilling`, dependency resolution and reverse dependency queries are lookups and traversals of the
+    graph instead of repeated scans of the repositories.
+
+    # Arguments
+    sources (APTSources): the repositories to build the graph of
+
+    # Examples
+    ```python
+    graph = sources.graph
+    graph.reverse_dependencies(graph.get('libssl1.1').pop())
+    ```
+    """
+    def __init__(self, sources):
+        self.metrics = sources.metrics
+        self.packages = list(sources.packages)
+
+        # one index per repository, so candidates are ordered by repository first like in `APTSources`
+        self._provided = [
+            {name: list(packs) for name, packs in rep._cache_provided_packages.items()}
+            for rep in sources.repositories
+        ]
+
+        self._edges = {}
+        self._candidates = {}
+        self._reverse = {}
+        for pack in self.packages:
+            edges = []
+            for dep in pack.depends + pack.predepends:
+                candidates = list(self._fulfilling(dep))
+                self._candidates[dep] = candidates
+                edges.append((dep, candidates))
+                for candidate in candidates:
+                    if candidate in self._reverse:
+                        self._reverse[candidate].append(pack)
+                    else:
+                        self._reverse[candidate] = [pack]
+            self._edges[pack] = edges
+
+    def _fulfilling(self, dependency):
+        names = dependency.package_name
+        if isinstance(names, str):
+            names = [names]
+        for provided in self._provided:
+            for name in names:
+                for pack in provided.get(name, ()):
+                    if dependency.fulfilled(pack):
+                        yield pack
+
+    def get(self, name):
+        """Returns all packages with the given name"""
+        return {pack for pack in self.get_provided(name) if pack.package == name}
+
+    def get_provided(self, name):
+        """Returns all packages with the given name or providing it"""
+        return {pack for provided in self._provided for pack in provided.get(name, ())}
+
+    def packages_fulfilling(self, dependency):
+        """Yields all packages fulfilling dependency in the same order as `APTSources.packages_fulfilling`"""
+        if dependency in self._candidates:
+            return iter(self._candidates[dependency])
+        return self._fulfilling(dependency)
+
+    def dependencies(self, package):
+        """
+        Returns the dependency edges of package as a list of tuples of the dependency and the packages fulfilling it
+
+        # Arguments
+        package (BinaryPackage): the package to return the edges of
+        """
+        return self._edges.get(package, [])
+
+    def reverse_dependencies(self, package):
+        """
+        Returns all packages that have a dependency fulfilled by package
+
+        # Arguments
+        package (BinaryPackage): the package to return the reverse dependencies of
+        """
+        return list(self._reverse.get(package, []))
+
+    def closure(self, packages):
+        """
+        Returns the given packages and recursively all packages fulfilling their dependencies
+
+        # Arguments
+        packages (iterable): the packages to resolve
+        """
+        resolver = DependencyResolver(self)
+        for pack in packages:
+            resolver.add(pack)
+        return resolver.selected
@@ -0,0 +1,64 @@
+import mmap
+import re
+
+
+class PackagesFileIndex:
+    """
+    Index from package names to the byte offsets of their stanzas in an uncompressed Packages file
+
+    The file is memory-mapped and only scanned for `Package` and `Provides` lines when the index is built. Stanzas
+    are parsed when they are looked up and the resulting packages are kept, so each stanza is parsed at most once
+    and repeated lookups return the same objects.
+
+    # Arguments
+    path (str): path to the uncompressed Packages file
+    package_factory (callable): creates a package out of the text of a stanza
+    """
+    re_field = re.compile(rb'^(Package|Provides):[ \t]*(.*?)[ \t]*$', flags=re.MULTILINE)
+
+    def __init__(self, path, package_factory):
+        self.path = path
+        self.package_factory = package_factory
+        with open(path, 'rb') as fp:
+            try:
+                self._content = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self._content = b''
+        self._packages = {}
+
+        self.names = {}
+        self.provided = {}
+        for match in self.re_field.finditer(self._content):
+            offset = self._content.rfind(b'\n\n', 0, match.start()) + 2
+            if offset == 1:
+                offset = 0
+            if match.group(1) == b'Package':
+                names = [match.group(2).decode('utf-8')]
+                self._add(self.names, names[0], offset)
+            else:
+                names = [name.strip() for name in match.group(2).decode('utf-8').split(',')]
+            for name in names:
+                self._add(self.provided, name, offset)
+
+    @staticmethod
+    def _add(index, name, offset):
+        if name in index:
+            index[name].append(offset)
+        else:
+            index[name] = [offset]
+
+    def package(self, offset):
+        """Returns the package whose stanza starts at offset"""
+        if offset not in self._packages:
+            end = self._content.find(b'\n\n', offset)
+            stanza = self._content[offset:end if end != -1 else len(self._content)]
+            self._packages[offset] = self.package_factory(stanza.decode('utf-8'))
+        return self._packages[offset]
+
+    def get(self, name):
+        """Returns all packages with the given name"""
+        return [self.package(offset) for offset in self.names.get(name, [])]
+
+    def get_provided(self, name):
+        """Returns all packages with the given name or providing it"""
+        return [self.package(offset) for offset in self.provided.get(name, [])]
@@ -0,0 +1,136 @@
+import contextlib
+import threading
+import time
+
+
+class Metrics:
+    """
+    Collects counters and timings of fetching, parsing, resolving and mirroring
+
+    Timings are accumulated per name together with the number of calls, e.g. `fetch`, `decompress`, `parse` or
+    `resolve`. Counters are summed per name, e.g. `parse.stanzas` or `cache.snapshot.hit`. Transfers record the
+    bytes and seconds of every downloaded URL. All methods are thread safe.
+
+    Subclass and override `count`, `timing` and `transfer` to forward the measurements to other systems.
+
+    # Examples
+    ```python
+    metrics = Metrics()
+    sources = APTSources(repositories, metrics=metrics)
+    sources.load()
+    print(metrics.summary())
+    ```
+    """
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+        self.transfers = {}
+
+    def count(self, name, value=1):
+        """Adds value to the counter name"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timing(self, name, seconds):
+        """Adds a call taking seconds to the timing name"""
+        with self._lock:
+            total, calls = self.timings.get(name, (0.0, 0))
+            self.timings[name] = (total + seconds, calls + 1)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Context manager recording the time spent in its block as timing name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing(name, time.perf_counter() - start)
+
+    def transfer(self, url, size, seconds):
+        """
+        Records a download
+
+        # Arguments
+        url (str): the downloaded URL
+        size (int): number of bytes received
+        seconds (float): time spent receiving
+        """
+        with self._lock:
+            previous_size, previous_seconds = self.transfers.get(url, (0, 0.0))
+            self.transfers[url] = (previous_size + size, previous_seconds + seconds)
+
+    def summary(self, slowest=5):
+        """
+        Returns a human readable report of all measurements
+
+        # Arguments
+        slowest (int): number of downloads with the lowest rate to list, default: 5
+        """
+        with self._lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+            transfers = dict(self.transfers)
+
+        lines = []
+        if timings:
+            lines.append('Timings:')
+            lines += ['  {:<28} {:>10.3f} s {:>10,} calls'.format(name, total, calls)
+                      for name, (total, calls) in sorted(timings.items())]
+        if counters:
+            lines.append('Counters:')
+            lines += ['  {:<28} {:>12,}'.format(name, value) for name, value in sorted(counters.items())]
+        if transfers:
+            size = sum(size for size, seconds in transfers.values())
+            seconds = sum(seconds for size, seconds in transfers.values())
+            lines.append('Downloads: {:,} files, {:,.1f} MB in {:.3f} s, {:,.1f} MB/s'.format(
+                len(transfers), size / 2**20, seconds, size / 2**20 / seconds if seconds else 0
+            ))
+            rates = sorted(transfers.items(), key=lambda item: item[1][0] / item[1][1] if item[1][1] else float('inf'))
+            lines += ['  {:>10,.1f} MB/s {}'.format(size / 2**20 / seconds if seconds else 0, url)
+                      for url, (size, seconds) in rates[:slowest]]
+        return '\n'.join(lines)
+
+
+class _NullTimer:
+    """Context manager doing nothing, like `contextlib.nullcontext` which needs Python 3.7"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullMetrics(Metrics):
+    """
+    Metrics that discard all measurements
+
+    Instrumented code checks `enabled` before taking timestamps, so disabled metrics cost next to nothing.
+    """
+    enabled = False
+
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+        self.transfers = {}
+
+    def count(self, name, value=1):
+        pass
+
+    def timing(self, name, seconds):
+        pass
+
+    def timer(self, name):
+        return _NULL_TIMER
+
+    def transfer(self, url, size, seconds):
+        pass
+
+    def summary(self, slowest=5):
+        return ''
+
+
+_NULL_TIMER = _NullTimer()
+NULL_METRICS = NullMetrics()
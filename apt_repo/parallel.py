@@ -0,0 +1,129 @@
+import contextlib
+import mmap
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+
+def stanza_ranges(content, parts):
+    """
+    Splits content into at most parts byte ranges which start and end at stanza boundaries
+
+    Returns a list of (start, end) tuples covering the whole content in order.
+
+    # Arguments
+    content (bytes): the content of a Packages file, or a memory map of it
+    parts (int): the number of ranges to aim for
+    """
+    ranges = []
+    start = 0
+    for part in range(1, parts):
+        boundary = content.find(b'\n\n', max(start, len(content) * part // parts))
+        if boundary == -1:
+            break
+        ranges.append((start, boundary + 2))
+        start = boundary + 2
+    if start < len(content) or not ranges:
+        ranges.append((start, len(content)))
+    return ranges
+
+
+def _parse_range(path, start, end, compact):
+    """Parses the stanzas in a byte range of a Packages file, runs in the worker processes"""
+    from . import CompactBinaryPackage, _parse_stanza
+
+    with open(path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        text = content[start:end].decode('utf-8')
+    if compact:
+        return [CompactBinaryPackage(stanza, None).values for stanza in text.split('\n\n') if stanza.strip()]
+    # the stanzas themselves are not sent back, the parent reads them from the file
+    results = []
+    position = 0
+    for stanza in text.split('\n\n'):
+        if stanza.strip():
+            fields = _parse_stanza(stanza)
+            provides = [name.strip() for name in fields['Provides'].split(',')] if 'Provides' in fields else []
+            results.append((position, position + len(stanza), fields['Package'], provides))
+        position += len(stanza) + 2
+    return results
+
+
+def start_pool(processes):
+    """
+    Returns a pool of processes for `parse_packages_file` with all worker processes started
+
+    Workers are started right away instead of on the first parsed file, so a pool created before loading threads
+    are started does not fork a process running these threads.
+
+    # Arguments
+    processes (int): number of worker processes
+    """
+    executor = ProcessPoolExecutor(processes)
+    executor.submit(os.getpid).result()
+    return executor
+
+
+def parse_packages_file(path, processes, compact=False, executor=None):
+    """
+    Parses an uncompressed Packages file in a pool of processes
+
+    The file is split at stanza boundaries into a few ranges per process. The workers map the file and only
+    receive the file name and their range, so the content is shared through the page cache instead of being sent
+    to every process. The results are returned in the order of the stanzas in the file: for compact parsing the
+    interned `values` of each `CompactBinaryPackage`, otherwise tuples of the stanza, its `Package` field and the
+    names of its `Provides` field.
+
+    Unpickling the stanzas and their fields in the calling process would take about as long as parsing them, so
+    unless parsing compact values, the workers only send back the names and the offsets of the stanzas, which the
+    calling process cuts out of the file.
+
+    # Arguments
+    path (str): path to the uncompressed Packages file
+    processes (int): number of worker processes
+    compact (bool): parse into the values of `CompactBinaryPackage`, default: False
+    executor (ProcessPoolExecutor): the pool to parse in, e.g. created by `start_pool` and shared by all files,
+        default: a pool of processes created for this file
+    """
+    if os.path.getsize(path) == 0:
+        return []
+    with open(path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        ranges = stanza_ranges(content, processes * 4)
+
+    with contextlib.ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ProcessPoolExecutor(processes))
+        futures = [executor.submit(_parse_range, path, start, end, compact) for start, end in ranges]
+        if compact:
+            return [
+                tuple([value if value is None else sys.intern(value) for value in values])
+                for future in futures for values in future.result()
+            ]
+        results = []
+        with open(path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            for (start, end), future in zip(ranges, futures):
+                text = content[start:end].decode('utf-8')
+                results += [(text[first:last], name, provides) for first, last, name, provides in future.result()]
+        return results
+
+
+def parse_packages_chunks(chunks, processes, compact=False, executor=None):
+    """
+    Parses the decompressed chunks of a Packages file in a pool of processes, see `parse_packages_file`
+
+    The chunks are written to a temporary file the worker processes map.
+
+    # Arguments
+    chunks (iterable): the decompressed content of the Packages file in chunks
+    processes (int): number of worker processes
+    compact (bool): parse into the values of `CompactBinaryPackage`, default: False
+    executor (ProcessPoolExecutor): the pool to parse in, default: a pool of processes created for this file
+    """
+    fd, path = tempfile.mkstemp(prefix='apt-repo-', suffix='.Packages')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+        return parse_packages_file(path, processes, compact, executor)
+    finally:
+        os.remove(path)
@@ -0,0 +1,102 @@
+import re
+
+
+_ED_COMMAND = re.compile(rb'^(?:(\d+)(?:,(\d+))?)?([acd])$')
+
+
+def apply_ed_patch(lines, patch):
+    """
+    Applies a patch in the format of `diff --ed` as used by pdiffs
+
+    Returns the patched lines.
+
+    # Arguments
+    lines (list): the lines of the file as bytes including their line endings
+    patch (bytes): the content of the patch
+    """
+    lines = list(lines)
+    commands = patch.splitlines(keepends=True)
+    current = 0
+    i = 0
+    while i < len(commands):
+        command = commands[i].rstrip(b'\n')
+        i += 1
+        if not command:
+            continue
+        if command == b's/.//':
+            lines[current] = lines[current][1:]
+            continue
+
+        match = _ED_COMMAND.match(command)
+        if match is None:
+            raise ValueError('Invalid ed command {!r}'.format(command))
+        start = int(match.group(1)) if match.group(1) else current + 1
+        end = int(match.group(2) or start)
+        operation = match.group(3)
+
+        text = []
+        if operation in (b'a', b'c'):
+            while i < len(commands) and commands[i].rstrip(b'\n') != b'.':
+                text.append(commands[i])
+                i += 1
+            i += 1
+
+        if operation == b'a':
+            lines[start:start] = text
+            current = start + len(text) - 1
+        elif operation == b'c':
+            lines[start - 1:end] = text
+            current = start - 1 + len(text) - 1
+        else:
+            del lines[start - 1:end]
+            current = start - 1
+    return lines
+
+
+class PDiffIndex:
+    """
+    Class that represents a `Packages.diff/Index` file
+
+    # Arguments
+    fields (dict): the parsed fields of the Index file
+    """
+    def __init__(self, fields):
+        self.fields = fields
+
+    def _entries(self, key):
+        return [line.split() for line in self.fields.get(key, '').split('\n') if line.strip()]
+
+    @property
+    def current(self):
+        """Returns the SHA256 hash of the current index"""
+        return self.fields['SHA256-Current'].split()[0]
+
+    @property
+    def history(self):
+        """Returns tuples of the SHA256 hash of an earlier index and the name of the patch to apply to it"""
+        return [(hash, name) for hash, size, name in self._entries('SHA256-History')]
+
+    @property
+    def patches(self):
+        """Returns a dictionary mapping the name of a patch to the SHA256 hash of its uncompressed content"""
+        return {name: hash for hash, size, name in self._entries('SHA256-Patches')}
+
+    @property
+    def merged(self):
+        """Returns True if each patch updates its index directly to the current one"""
+        return self.fields.get('X-Patch-Precedence') == 'merged'
+
+    def patches_from(self, sha256):
+        """
+        Returns the names of the patches to apply in order to update the index with the given hash
+
+        Returns `None` if the index is not listed in the history.
+
+        # Arguments
+        sha256 (str): the SHA256 hash of the local index
+        """
+        names = [name for hash, name in self.history]
+        for index, (hash, name) in enumerate(self.history):
+            if hash == sha256:
+                return [name] if self.merged else names[index:]
+        return None
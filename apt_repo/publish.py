@@ -0,0 +1,125 @@
+import email.utils
+import gzip
+import hashlib
+import lzma
+import os
+
+from .downloader import mkdirs_if_not_exist
+
+
+# fields copied from the upstream Release file into the Release file of a mirror
+RELEASE_FIELDS = ('Origin', 'Label', 'Suite', 'Version', 'Codename', 'Description')
+
+
+class _HashingFile:
+    """Write-only file object computing the size and the MD5 and SHA256 hashes of everything written to it"""
+    def __init__(self, fp):
+        self.fp = fp
+        self.size = 0
+        self.md5 = hashlib.md5()
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        self.md5.update(data)
+        self.sha256.update(data)
+        return self.fp.write(data)
+
+    def flush(self):
+        self.fp.flush()
+
+
+class IndexWriter:
+    """
+    Writes a Packages or Sources file together with its gzip and xz compressed variants in a single pass
+
+    Stanzas are compressed and hashed as they are written, so the index is never held in memory. The files are
+    written next to their final paths and only replace them on `close`.
+
+    # Arguments
+    path (str): path of the uncompressed index, e.g. `.../dists/bionic/main/binary-amd64/Packages`
+
+    # Examples
+    ```python
+    with IndexWriter(path) as index:
+        for pack in packages:
+            index.write(pack.content)
+    index.files
+    ```
+    """
+    SUFFIXES = ('', '.gz', '.xz')
+
+    def __init__(self, path):
+        self.path = path
+        self.files = None
+        self.count = 0
+        mkdirs_if_not_exist(path)
+        self._fps = [open(path + suffix + '.tmp', 'wb') for suffix in self.SUFFIXES]
+        self._hashing = [_HashingFile(fp) for fp in self._fps]
+        self._streams = [
+            self._hashing[0],
+            gzip.GzipFile(filename='', mode='wb', fileobj=self._hashing[1], mtime=0),
+            lzma.LZMAFile(self._hashing[2], 'wb'),
+        ]
+
+    def write(self, stanza):
+        """Appends a stanza to the index"""
+        data = ('\n' if self.count else '').encode('utf-8') + stanza.strip().encode('utf-8') + b'\n'
+        self.count += 1
+        for stream in self._streams:
+            stream.write(data)
+
+    def close(self):
+        """
+        Finishes the files and moves them into place
+
+        Sets `files` to a list of tuples of the suffix, size, MD5 and SHA256 hex digests of every written file.
+        """
+        for stream in self._streams[1:]:
+            stream.close()
+        for fp in self._fps:
+            fp.close()
+        for suffix in self.SUFFIXES:
+            os.replace(self.path + suffix + '.tmp', self.path + suffix)
+        self.files = [
+            (suffix, hashing.size, hashing.md5.hexdigest(), hashing.sha256.hexdigest())
+            for suffix, hashing in zip(self.SUFFIXES, self._hashing)
+        ]
+
+    def abort(self):
+        """Closes and removes the partially written files"""
+        for fp in self._fps:
+            fp.close()
+        for suffix in self.SUFFIXES:
+            if os.path.exists(self.path + suffix + '.tmp'):
+                os.remove(self.path + suffix + '.tmp')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_release(path, fields, files):
+    """
+    Writes a Release file listing the given index files with their sizes and hashes
+
+    # Arguments
+    path (str): path of the Release file
+    fields (dict): fields written before the hashes, e.g. `Suite` and `Components`, `Date` defaults to now
+    files (list): tuples of the path relative to the Release file, size, MD5 and SHA256 hex digests
+    """
+    fields = dict(fields)
+    fields.setdefault('Date', email.utils.formatdate(usegmt=True))
+    lines = ['{}: {}'.format(key, value) for key, value in fields.items() if value is not None]
+    for name, position in [('MD5Sum', 2), ('SHA256', 3)]:
+        lines.append(name + ':')
+        lines += [' {} {:>16} {}'.format(entry[position], entry[1], entry[0]) for entry in sorted(files)]
+    mkdirs_if_not_exist(path)
+    with open(path + '.tmp', 'w') as fp:
+        fp.write('\n'.join(lines) + '\n')
+    os.replace(path + '.tmp', path)
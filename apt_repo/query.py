@@ -0,0 +1,153 @@
+import operator
+import re
+from array import array
+
+from .version import version_key
+
+
+_VERSION_CONSTRAINT = re.compile(r'(>>|<<|>=|<=|=|>|<)\s*([^\s,]+)')
+
+# same semantics as `BinaryPackageDependency.fulfilled`, including the obsolete `<` and `>`
+_VERSION_OPERATORS = {
+    '>=': operator.ge, '=': operator.eq, '<<': operator.lt, '>>': operator.gt,
+    '<=': operator.le, '<': operator.le, '>': operator.ge,
+}
+
+
+def _parse_versions(versions):
+    """Returns tuples of comparison function and version key out of constraints like `'>= 1.0, << 2.0'`"""
+    constraints = _VERSION_CONSTRAINT.findall(versions)
+    if not constraints or _VERSION_CONSTRAINT.sub('', versions).replace(',', '').strip():
+        raise ValueError('Invalid version range "{}"'.format(versions))
+    return [(_VERSION_OPERATORS[constraint], version_key(version)) for constraint, version in constraints]
+
+
+class PackageTable:
+    """
+    Columnar table of all packages of a collection of repositories for batch queries
+
+    The table is built once: for each column the distinct values are numbered, every package gets a row with the
+    value ids of its columns and the rows of each value are indexed. Queries start from the indexed rows of the
+    most selective criterion and check the remaining criteria against the value id columns, so selecting all
+    packages of one architecture and repository touches neither stanzas nor package objects.
+
+    The component of packages of repositories loaded from a snapshot is `None`.
+
+    # Arguments
+    sources (APTSources): the repositories to build the table of
+
+    # Examples
+    ```python
+    sources.table.select(url='http://archive.ubuntu.com/ubuntu', architecture=['amd64', 'all'])
+    sources.table.select(section='python', name=r'python3-.*', versions='>= 3.6')
+    ```
+    """
+    COLUMNS = ('url', 'component', 'architecture', 'section', 'priority')
+
+    def __init__(self, sources):
+        self.packages = []
+        self._ids = {column: {} for column in self.COLUMNS}
+        self._columns = {column: array('I') for column in self.COLUMNS}
+        self._rows = {column: [] for column in self.COLUMNS}
+        self._names = {}
+
+        for rep in sources.repositories:
+            for component, packs in self._package_lists(rep):
+                for pack in packs:
+                    fields = pack.fields
+                    self._add(pack, {
+                        'url': rep.url,
+                        'component': component,
+                        'architecture': fields.get('Architecture'),
+                        'section': fields.get('Section'),
+                        'priority': fields.get('Priority'),
+                    })
+
+    @staticmethod
+    def _package_lists(rep):
+        """Yields the component and the list of packages of each Packages file of rep"""
+        packages = rep.packages
+        by_index = getattr(rep, '_cache_index_packages', None)
+        if by_index:
+            for (component, arch), packs in by_index.items():
+                yield component, packs
+        else:
+            for packs in packages.values():
+                yield None, packs
+
+    def _add(self, pack, values):
+        row = len(self.packages)
+        self.packages.append(pack)
+        for column, value in values.items():
+            ids = self._ids[column]
+            if value not in ids:
+                ids[value] = len(ids)
+                self._rows[column].append(array('I'))
+            self._columns[column].append(ids[value])
+            self._rows[column][ids[value]].append(row)
+        name = pack.package
+        if name in self._names:
+            self._names[name].append(row)
+        else:
+            self._names[name] = array('I', [row])
+
+    def values(self, column):
+        """Returns the distinct values of a column"""
+        return list(self._ids[column])
+
+    def select(self, url=None, component=None, architecture=None, section=None, priority=None, name=None,
+               versions=None):
+        """
+        Returns all packages matching all given criteria in table order
+
+        Each of url, component, architecture, section and priority is either a single value or a collection of
+        accepted values.
+
+        # Arguments
+        url (str): URL of the repository
+        component (str): component of the Packages file
+        architecture (str): value of the `Architecture` field
+        section (str): value of the `Section` field
+        priority (str): value of the `Priority` field
+        name (str): regular expression the whole package name has to match
+        versions (str): version constraints the package version has to fulfill, e.g. `'>= 1.0, << 2.0'`
+        """
+        criteria = {}
+        for column, accepted in zip(self.COLUMNS, [url, component, architecture, section, priority]):
+            if accepted is None:
+                continue
+            if isinstance(accepted, str):
+                accepted = [accepted]
+            criteria[column] = {self._ids[column][value] for value in accepted if value in self._ids[column]}
+            if not criteria[column]:
+                return []
+
+        candidates = []
+        if name is not None:
+            match = re.compile(name).fullmatch
+            candidates.append(('name', [rows for value, rows in self._names.items() if match(value)]))
+        for column, ids in criteria.items():
+            candidates.append((column, [self._rows[column][value_id] for value_id in ids]))
+
+        if candidates:
+            driver, row_lists = min(candidates, key=lambda candidate: sum(len(rows) for rows in candidate[1]))
+            rows = row_lists[0] if len(row_lists) == 1 else sorted(row for rows in row_lists for row in rows)
+        else:
+            driver, rows = None, range(len(self.packages))
+
+        if name is not None and driver != 'name':
+            match = re.compile(name).fullmatch
+            rows = [row for row in rows if match(self.packages[row].package)]
+        for column, ids in criteria.items():
+            if column != driver:
+                values = self._columns[column]
+                rows = [row for row in rows if values[row] in ids]
+
+        packages = [self.packages[row] for row in rows]
+        if versions is not None:
+            constraints = _parse_versions(versions)
+            packages = [
+                pack for pack in packages
+                if all(compare(version_key(pack.version), key) for compare, key in constraints)
+            ]
+        return packages
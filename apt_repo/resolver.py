@@ -0,0 +1,116 @@
+import logging
+
+from .metrics import NULL_METRICS
+
+
+class DependencyResolver:
+    """
+    Computes the dependency closure of binary packages
+
+    Dependencies are followed with an explicit stack instead of recursion, so deep dependency chains can not exceed
+    Python's recursion limit. The selected packages are indexed by their names and provides, which turns the check
+    whether a dependency is already fulfilled by a selected package into a dictionary lookup.
+
+    The packages are visited in the same order as a depth-first recursion, so the closure is the same as the one
+    `BinaryPackage.dependencies` always computed.
+
+    Resolution time and the number of visited candidates are recorded as `resolve` and `resolve.iterations` in
+    the metrics of sources.
+
+    # Arguments
+    sources (APTSources): the sources to pick dependencies from
+    selected (set): packages already selected, default: empty set
+
+    # Examples
+    ```python
+    resolver = DependencyResolver(sources)
+    for pack in sources.get('ubuntu-desktop'):
+        resolver.add(pack)
+    resolver.selected
+    ```
+    """
+    def __init__(self, sources, selected=None):
+        self.sources = sources
+        self.metrics = getattr(sources, 'metrics', NULL_METRICS)
+        self.selected = set() if selected is None else selected
+        self._provided = {}
+        self._done = set(self.selected)
+        for pack in self.selected:
+            self._index(pack)
+
+    def _index(self, pack):
+        for name in [pack.package] + pack.provides:
+            if name in self._provided:
+                self._provided[name].append(pack)
+            else:
+                self._provided[name] = [pack]
+
+    def fulfilled(self, dependency):
+        """Checks if dependency is fulfilled by any of the selected packages."""
+        names = dependency.package_name
+        if isinstance(names, str):
+            names = [names]
+        for name in names:
+            for pack in self._provided.get(name, ()):
+                if dependency.fulfilled(pack):
+                    return True
+        return False
+
+    def _enter(self, pack):
+        if pack not in self.selected:
+            self.selected.add(pack)
+            self._index(pack)
+        logging.getLogger(__name__).debug('Check dependencies of {}'.format(pack))
+        return self._candidates(pack)
+
+    def _candidates(self, pack):
+        """Yields the packages whose dependencies need to be visited next, like the recursive calls would."""
+        for dep in pack.depends + pack.predepends:
+            if self.fulfilled(dep):
+                continue
+            found = False
+            for candidate in self.sources.packages_fulfilling(dep):
+                found = True
+                yield candidate
+            if not found:
+                logging.getLogger(__name__).warning('No package found matching "{}"'.format(dep))
+        self._done.add(pack)
+
+    def add_dependencies(self, dependencies):
+        """
+        Adds all packages fulfilling the dependencies which are not fulfilled yet and recursively their dependencies
+
+        # Arguments
+        dependencies (list): `BinaryPackageDependency` objects, e.g. the build dependencies of a source package
+        """
+        for dep in dependencies:
+            if self.fulfilled(dep):
+                continue
+            candidates = list(self.sources.packages_fulfilling(dep))
+            if not candidates:
+                logging.getLogger(__name__).warning('No package found matching "{}"'.format(dep))
+            for candidate in candidates:
+                self.add(candidate)
+        return self.selected
+
+    def add(self, package):
+        """
+        Adds package and recursively all packages fulfilling its dependencies to the selected packages
+
+        # Arguments
+        package (BinaryPackage): the package to add
+        """
+        iterations = 0
+        with self.metrics.timer('resolve'):
+            stack = [self._enter(package)]
+            while stack:
+                iterations += 1
+                try:
+                    candidate = next(stack[-1])
+                except StopIteration:
+                    stack.pop()
+                    continue
+                if candidate not in self._done:
+                    stack.append(self._enter(candidate))
+        self.metrics.count('resolve.iterations', iterations)
+        return self.selected
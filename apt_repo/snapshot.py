@@ -0,0 +1,184 @@
+import mmap
+import os
+import struct
+import tempfile
+
+
+MAGIC = b'APTSNAP1'
+MISSING = 0xFFFFFFFF
+
+# magic, byte order mark, number of fields, strings, packages and provides entries
+_HEADER = struct.Struct('=8sIIIII')
+_BYTE_ORDER_MARK = 0x01020304
+
+
+def _provides(row, fields):
+    """Returns the names a row of package fields is available under, like `BinaryPackage.provides`"""
+    names = [row[fields.index('Package')]]
+    provides = row[fields.index('Provides')]
+    if provides:
+        names += [name.strip() for name in provides.split(',')]
+    return names
+
+
+def write_snapshot(path, fields, rows):
+    """
+    Writes packages to a snapshot file
+
+    The file consists of a header, the table of field names, the offsets of all distinct strings, one row of
+    string ids per package, the package indices sorted by name, the provides entries sorted by name and finally the
+    pool of UTF-8 encoded strings. All integers are native 32-bit unsigned integers, so the tables can be used
+    directly from a memory-mapped file.
+
+    # Arguments
+    path (str): the file to write
+    fields (list): the names of the stored fields, must contain 'Package' and 'Provides'
+    rows (list): one tuple of field values or `None` per package, aligned to fields
+    """
+    strings = {}
+
+    def intern(value):
+        if value is None:
+            return MISSING
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    field_ids = [intern(field) for field in fields]
+    table = [intern(value) for row in rows for value in row]
+    names = sorted(range(len(rows)), key=lambda index: rows[index][fields.index('Package')].encode('utf-8'))
+    provides = sorted(
+        ((name.encode('utf-8'), index) for index, row in enumerate(rows) for name in _provides(row, fields)),
+    )
+    provides_names = [intern(name.decode('utf-8')) for name, index in provides]
+    provides_packages = [index for name, index in provides]
+
+    pool = [value.encode('utf-8') for value in strings]
+    offsets = [0]
+    for value in pool:
+        offsets.append(offsets[-1] + len(value))
+
+    def array(values):
+        return struct.pack('={}I'.format(len(values)), *values)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(_HEADER.pack(MAGIC, _BYTE_ORDER_MARK, len(fields), len(pool), len(rows), len(provides)))
+            for values in [field_ids, offsets, table, names, provides_names, provides_packages]:
+                fp.write(array(values))
+            fp.write(b''.join(pool))
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class PackageSnapshot:
+    """
+    Memory-mapped snapshot of the packages of a repository
+
+    Nothing is parsed or copied when a snapshot is opened: the tables are accessed directly in the mapped file
+    and strings are only decoded when they are read. Packages are created on first access by package_factory
+    and kept, so every lookup returns the same objects. Processes opening the same snapshot share its pages.
+
+    # Arguments
+    path (str): the snapshot file written by `write_snapshot`
+    package_factory (callable): creates a package view out of the snapshot and the index of the package
+    """
+    def __init__(self, path, package_factory):
+        self.path = path
+        self.package_factory = package_factory
+        with open(path, 'rb') as fp:
+            self._content = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, byte_order_mark, n_fields, n_strings, n_packages, n_provides = _HEADER.unpack_from(self._content)
+        if magic != MAGIC or byte_order_mark != _BYTE_ORDER_MARK:
+            raise ValueError('"{}" is not a snapshot of this platform'.format(path))
+
+        view = memoryview(self._content)
+        offset = _HEADER.size
+        arrays = []
+        for count in [n_fields, n_strings + 1, n_packages * n_fields, n_packages, n_provides, n_provides]:
+            arrays.append(view[offset:offset + 4 * count].cast('I'))
+            offset += 4 * count
+        self._field_ids, self._offsets, self._table, self._names, self._provides_names, self._provides_packages = arrays
+        self._pool = offset
+
+        self.fields = [self.string(string_id) for string_id in self._field_ids]
+        self._package_field = self.fields.index('Package')
+        self._packages = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def string(self, string_id):
+        """Returns the string with the given id from the string pool"""
+        if string_id == MISSING:
+            return None
+        start = self._pool + self._offsets[string_id]
+        return self._content[start:self._pool + self._offsets[string_id + 1]].decode('utf-8')
+
+    def value(self, index, field):
+        """
+        Returns the value of a field of a package or `None` if the package has no such field
+
+        # Arguments
+        index (int): index of the package
+        field (int): position of the field in `fields`
+        """
+        return self.string(self._table[index * len(self.fields) + field])
+
+    def row(self, index):
+        """Returns the values of all fields of a package"""
+        start = index * len(self.fields)
+        return tuple(self.string(string_id) for string_id in self._table[start:start + len(self.fields)])
+
+    def package(self, index):
+        """Returns the package with the given index"""
+        if index not in self._packages:
+            self._packages[index] = self.package_factory(self, index)
+        return self._packages[index]
+
+    @property
+    def packages(self):
+        """Returns all packages in the order they were written"""
+        return [self.package(index) for index in range(len(self))]
+
+    def _range(self, string_ids, count, name):
+        """
+        Returns the range of positions of a sorted array whose strings equal name
+
+        # Arguments
+        string_ids (callable): returns the string id at a position of the array
+        count (int): the length of the array
+        name (str): the string to search for
+        """
+        name = name.encode('utf-8')
+
+        def key(position):
+            string_id = string_ids(position)
+            return self._content[self._pool + self._offsets[string_id]:self._pool + self._offsets[string_id + 1]]
+
+        def bisect(right):
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if key(mid) < name or (right and key(mid) == name):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+
+        return range(bisect(False), bisect(True))
+
+    def get(self, name):
+        """Returns all packages with the given name"""
+        def string_ids(position):
+            return self._table[self._names[position] * len(self.fields) + self._package_field]
+        return [self.package(self._names[position]) for position in self._range(string_ids, len(self), name)]
+
+    def get_provided(self, name):
+        """Returns all packages with the given name or providing it"""
+        positions = self._range(self._provides_names.__getitem__, len(self._provides_names), name)
+        return [self.package(self._provides_packages[position]) for position in positions]
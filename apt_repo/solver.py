@@ -0,0 +1,255 @@
+import logging
+
+from .metrics import NULL_METRICS
+from .version import version_key
+
+
+DEFAULT_PRIORITY = 500
+
+
+class DependencySolver:
+    """
+    Computes an installable set of binary packages
+
+    Unlike `DependencyResolver`, which adds every package fulfilling a dependency, the solver selects one package
+    per dependency and at most one version of every package name, so the result is a set that could be installed
+    together:
+
+    - alternatives are tried in the order they are listed, real packages before packages providing the name
+    - among the candidates of an alternative the repository with the highest priority wins, then the highest version
+    - candidates conflicting with or breaking selected packages, or broken by them, are skipped
+    - architecture qualifiers and `Multi-Arch` are honored: unqualified dependencies are fulfilled by packages of
+      the same architecture as the depending package or by `Multi-Arch: foreign` packages, `:any` dependencies by
+      `Multi-Arch: allowed` packages of any architecture
+    - `Recommends` are followed optionally, they are dropped if neither they nor their dependencies can be fulfilled
+
+    If a dependency can not be fulfilled, the solver goes back to the most recent choice with untried candidates.
+    If no choice is left or after max_backtracks attempts, the solver gives up on the dependency: it is recorded in
+    `unsatisfied` with a warning and solving continues, so the result is as complete as possible.
+
+    Solving time and the number of backtracks are recorded as `solve` and `solve.backtracks` in the metrics of
+    sources.
+
+    # Arguments
+    sources (APTSources): the sources to pick packages from
+    architecture (str): the native architecture, default: the first architecture of the first repository
+    recommends (bool): include packages fulfilling `Recommends`, default: False
+    priorities (dict): maps repositories to pin priorities like `apt_preferences`, packages of repositories with
+        a negative priority are never selected, default: 500 for all repositories
+    max_backtracks (int): maximum number of choices revised while solving, default: 1000
+
+    # Examples
+    ```python
+    solver = DependencySolver(sources, recommends=True, priorities={backports: 100})
+    solver.add_dependencies([BinaryPackageDependency('docker.io')])
+    solver.selected
+    ```
+    """
+    def __init__(self, sources, architecture=None, recommends=False, priorities=None, max_backtracks=1000):
+        self.sources = sources
+        self.metrics = getattr(sources, 'metrics', NULL_METRICS)
+        self.architecture = architecture or sources.repositories[0].architectures[0]
+        self.recommends = recommends
+        self.priorities = priorities or {}
+        self.max_backtracks = max_backtracks
+        self.unsatisfied = []
+        self._trail = []
+        self._keys = {}
+        self._provided = {}
+        self._forbidden = {}
+        self._restrictions = {}
+
+    @property
+    def selected(self):
+        """Returns the selected packages"""
+        return set(self._trail)
+
+    def add(self, package):
+        """
+        Selects package and solves its dependencies
+
+        Returns the selected packages.
+
+        # Arguments
+        package (BinaryPackage): the package to add
+        """
+        if self._keys.get(self._key(package)) is package:
+            return self.selected
+        if not self._allowed(package):
+            logging.getLogger(__name__).warning('Can not add {} to the selected packages'.format(package))
+            return self.selected
+        self._select(package)
+        return self._solve(self._requirements(package))
+
+    def add_dependencies(self, dependencies):
+        """
+        Selects packages fulfilling the dependencies and solves their dependencies
+
+        Returns the selected packages.
+
+        # Arguments
+        dependencies (list): `BinaryPackageDependency` objects, e.g. the build dependencies of a source package
+        """
+        return self._solve([(dep, None, False) for dep in dependencies])
+
+    def _requirements(self, package):
+        """Returns the dependencies of package to solve as tuples of dependency, package and whether it is optional"""
+        requirements = [(dep, package, False) for dep in package.predepends + package.depends]
+        if self.recommends:
+            requirements += [(dep, package, True) for dep in package.recommends]
+        return requirements
+
+    def _solve(self, requirements):
+        queue = list(requirements)
+        position = 0
+        choices = []
+        given_up = set()
+        backtracks = 0
+        with self.metrics.timer('solve'):
+            while position < len(queue):
+                dep, owner, optional = queue[position]
+                position += 1
+                if self._fulfilled(dep, owner):
+                    continue
+                candidates = iter(self._candidates(dep, owner))
+                state = (position, len(queue), len(self._trail), len(self.unsatisfied))
+                package = self._next_allowed(candidates)
+                if package is None and not optional and (str(dep), owner) not in given_up and choices:
+                    failed = (str(dep), owner)
+                    while package is None and choices and backtracks < self.max_backtracks:
+                        backtracks += 1
+                        state, candidates, optional = choices.pop()
+                        self._restore(queue, state)
+                        position = state[0]
+                        package = self._next_allowed(candidates)
+                        if package is None and optional:
+                            break
+                    if package is None and not optional:
+                        # revisit the last reverted choice from its best candidate, skipping the failed dependency
+                        given_up.add(failed)
+                        position -= 1
+                        continue
+                if package is None:
+                    if not optional:
+                        logging.getLogger(__name__).warning('No installable package found matching "{}"{}'.format(
+                            dep, ' required by {}'.format(owner) if owner else ''
+                        ))
+                        self.unsatisfied.append((dep, owner))
+                    continue
+                choices.append((state, candidates, optional))
+                self._select(package)
+                queue += self._requirements(package)
+        self.metrics.count('solve.backtracks', backtracks)
+        return self.selected
+
+    def _restore(self, queue, state):
+        """Reverts all selections made after state was taken"""
+        position, length, selected, unsatisfied = state
+        del queue[length:]
+        while len(self._trail) > selected:
+            self._unselect(self._trail.pop())
+        del self.unsatisfied[unsatisfied:]
+
+    def _next_allowed(self, candidates):
+        for package in candidates:
+            if self._allowed(package):
+                return package
+        return None
+
+    @staticmethod
+    def _key(package):
+        """Returns the key of package, only one package per key is selected"""
+        if package.multi_arch == 'same':
+            return package.package, package.architecture
+        return package.package
+
+    def _select(self, package):
+        self._trail.append(package)
+        self._keys[self._key(package)] = package
+        for name in [package.package] + package.provides:
+            self._provided.setdefault(name, []).append(package)
+        for dep in self._relations(package):
+            for name in self._names(dep):
+                self._forbidden.setdefault(name, []).append((dep, package))
+        logging.getLogger(__name__).debug('Select {}'.format(package))
+
+    def _unselect(self, package):
+        del self._keys[self._key(package)]
+        for name in [package.package] + package.provides:
+            self._provided[name].remove(package)
+        for dep in self._relations(package):
+            for name in self._names(dep):
+                self._forbidden[name].remove((dep, package))
+
+    def _relations(self, package):
+        """Returns the parsed `Conflicts` and `Breaks` of package"""
+        if package not in self._restrictions:
+            self._restrictions[package] = package.conflicts + package.breaks
+        return self._restrictions[package]
+
+    @staticmethod
+    def _names(dependency):
+        names = dependency.package_name
+        return [names] if isinstance(names, str) else names
+
+    @staticmethod
+    def _alternatives(dependency):
+        return getattr(dependency, 'or_dependencies', [dependency])
+
+    def _allowed(self, package):
+        """Checks if package can be selected together with the selected packages"""
+        if self.priorities.get(package.repository, DEFAULT_PRIORITY) < 0:
+            return False
+        if self._key(package) in self._keys:
+            return False
+        for dep in self._relations(package):
+            for name in self._names(dep):
+                for pack in self._provided.get(name, ()):
+                    if pack.package != package.package and dep.fulfilled(pack):
+                        return False
+        for name in [package.package] + package.provides:
+            for dep, owner in self._forbidden.get(name, ()):
+                if owner.package != package.package and dep.fulfilled(package):
+                    return False
+        return True
+
+    def _architecture(self, package):
+        return self.architecture if package is None or package.architecture == 'all' else package.architecture
+
+    def _architecture_matches(self, dependency, owner, package):
+        """Checks if package fulfills dependency of owner with regard to architecture qualifiers and Multi-Arch"""
+        qualifier = getattr(dependency, 'architecture', None)
+        architecture = self._architecture(package)
+        if qualifier == 'any':
+            return architecture == self._architecture(owner) or package.multi_arch in ('allowed', 'foreign')
+        if qualifier == 'native':
+            return architecture == self.architecture
+        if qualifier:
+            return architecture == qualifier
+        return architecture == self._architecture(owner) or package.multi_arch == 'foreign'
+
+    def _fulfilled(self, dependency, owner):
+        """Checks if dependency of owner is fulfilled by any of the selected packages"""
+        for alternative in self._alternatives(dependency):
+            for pack in self._provided.get(alternative.package_name, ()):
+                if alternative.fulfilled(pack) and self._architecture_matches(alternative, owner, pack):
+                    return True
+        return False
+
+    def _candidates(self, dependency, owner):
+        """Returns the packages fulfilling dependency of owner, the preferred ones first"""
+        candidates = []
+        seen = set()
+        for alternative in self._alternatives(dependency):
+            packs = [
+                pack for pack in self.sources.packages_fulfilling(alternative)
+                if pack not in seen and self._architecture_matches(alternative, owner, pack)
+            ]
+            packs.sort(key=lambda pack: (
+                pack.package == alternative.package_name,
+                self.priorities.get(pack.repository, DEFAULT_PRIORITY),
+                version_key(pack.version),
+            ), reverse=True)
+            seen.update(packs)
+            candidates += packs
+        return candidates
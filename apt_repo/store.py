@@ -0,0 +1,128 @@
+import errno
+import logging
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl cloning the extents of a file on Linux file systems supporting reflinks, e.g. btrfs and xfs
+_FICLONE = 0x40049409
+
+
+def _clone(source, target):
+    """Creates target as a reflink copy of source, raises OSError if the file system does not support it"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported')
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+class ContentStore:
+    """
+    Content-addressed store of mirrored files keyed by their SHA256 hash
+
+    Every file is stored once under `<directory>/<hash[:2]>/<hash>` and published into the mirror tree as a
+    hardlink, so the same package listed by several repositories or under several URLs takes the space of one
+    file. If the store and the mirror are on different file systems, files are published as reflinks where the file
+    system supports them and copied otherwise.
+
+    Files are only added after they were downloaded and verified, the store does not hash them again.
+
+    # Arguments
+    directory (str): the directory of the store, should be on the same file system as the mirror
+
+    # Examples
+    ```python
+    mirror = APTDependencyMirror(sources, '/srv/mirror', store=ContentStore('/srv/mirror/.store'))
+    ```
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, sha256):
+        """Returns the path of the file with the given hash in the store"""
+        return os.path.join(self.directory, sha256[:2], sha256)
+
+    def __contains__(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def add(self, sha256, path):
+        """
+        Adds the file at path to the store unless a file with the same hash is stored already
+
+        # Arguments
+        sha256 (str): the SHA256 hash of the file
+        path (str): the file to add, it is linked into the store and stays in place
+        """
+        target = self.path(sha256)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            self._link(path, target)
+        except FileExistsError:
+            pass
+
+    def publish(self, sha256, path):
+        """
+        Places the stored file with the given hash at path, replacing any file there
+
+        Returns False if the store has no such file.
+
+        # Arguments
+        sha256 (str): the SHA256 hash of the file
+        path (str): where to place the file
+        """
+        source = self.path(sha256)
+        if not os.path.exists(source):
+            return False
+        if os.path.exists(path) and os.path.samefile(source, path):
+            return True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.link'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            self._link(source, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return True
+
+    @staticmethod
+    def _link(source, target):
+        """Creates target as a hardlink of source, falling back to a reflink and a copy"""
+        try:
+            os.link(source, target)
+            return
+        except FileExistsError:
+            raise
+        except OSError:
+            pass
+        try:
+            _clone(source, target)
+            return
+        except OSError:
+            if os.path.exists(target):
+                os.remove(target)
+        shutil.copy2(source, target)
+
+    def prune(self):
+        """
+        Removes all stored files which are not published anymore, i.e. have no other hardlink
+
+        Files published as reflinks or copies are not tracked and are removed from the store as well.
+        """
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.stat(path).st_nlink == 1:
+                    os.remove(path)
+                    removed += 1
+        logging.getLogger(__name__).info('Removed {} unpublished files from the store'.format(removed))
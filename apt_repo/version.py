@@ -0,0 +1,80 @@
+import functools
+
+
+def _char_weight(char):
+    """Returns the sort weight of a character in a non-digit part, like dpkg's `order()`"""
+    if char == '~':
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+# marks the end of a version part, sorts after '~' and before every other character
+_END = ((0,), 0)
+
+
+def _part_key(part):
+    """
+    Returns a comparable key for the upstream version or the revision of a Debian version
+
+    The part is split into alternating non-digit and digit runs. Non-digit runs become tuples of character weights
+    terminated by 0, digit runs become integers, so comparing keys gives the same result as dpkg's `verrevcmp()`.
+    Only the first run may have an empty non-digit part, so it is always present to keep keys aligned.
+
+    # Arguments
+    part (str): the upstream version or revision
+    """
+    key = []
+    i = 0
+    while i < len(part):
+        start = i
+        while i < len(part) and not part[i].isdigit():
+            i += 1
+        letters = tuple(_char_weight(c) for c in part[start:i]) + (0,)
+        start = i
+        while i < len(part) and part[i].isdigit():
+            i += 1
+        key.append((letters, int(part[start:i] or 0)))
+    if not key:
+        key.append(_END)
+    key.append(_END)
+    return tuple(key)
+
+
+@functools.lru_cache(maxsize=2**16)
+def version_key(version):
+    """
+    Returns a key for sorting and comparing Debian version strings
+
+    Keys are cached, so each version string is only parsed once. Comparing two keys gives the same result as
+    `dpkg --compare-versions`, including the handling of epochs and `~`.
+
+    # Arguments
+    version (str): the Debian version string
+
+    # Examples
+    ```python
+    sorted(packages, key=lambda p: version_key(p.version))
+    ```
+    """
+    epoch, _, rest = version.partition(':') if ':' in version else ('0', '', version)
+    if '-' in rest:
+        upstream, _, revision = rest.rpartition('-')
+    else:
+        upstream, revision = rest, ''
+    return int(epoch or 0), _part_key(upstream), _part_key(revision)
+
+
+def compare_versions(a, b):
+    """
+    Compares two Debian version strings
+
+    Returns a negative number if a is lower than b, zero if they are equal and a positive number otherwise.
+
+    # Arguments
+    a (str): the first version
+    b (str): the second version
+    """
+    key_a, key_b = version_key(a), version_key(b)
+    return (key_a > key_b) - (key_a < key_b)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Benchmark of the dispatch overhead of mirror downloads
+
+Compares handing bound methods and packages to a `multiprocessing.Pool`, like `APTDependencyMirror.create` used to,
+with handing `DownloadJob` tuples to `Downloader.download_all`. The downloads themselves are no-ops, so only the
+dispatch is measured.
+
+    PYTHONPATH=. python benchmarks/bench_dispatch.py [count]
+"""
+import multiprocessing
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from apt_repo import APTRepository, APTSources
+from apt_repo.apt_mirror import APTDependencyMirror
+from apt_repo.downloader import Downloader
+from fixtures import make_repository
+
+
+class PoolMirror(APTDependencyMirror):
+    def _mirror_package(self, package):
+        return True
+
+
+class NoopDownloader(Downloader):
+    def download(self, remote, local, size=None, checksum=None):
+        return True
+
+
+def measure(method):
+    tracemalloc.start()
+    start = time.perf_counter()
+    method()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(count=20000):
+    with tempfile.TemporaryDirectory() as directory:
+        sources = APTSources([APTRepository(make_repository(directory, count), 'bionic', ['main'], ['amd64'])])
+        sources.load()
+        packages = list(sources.packages)[:2000]
+
+        mirror = PoolMirror(sources, directory, NoopDownloader())
+        jobs = [mirror._package_job(p) for p in packages]
+
+        def pool():
+            with multiprocessing.Pool(4) as pool:
+                pool.map(mirror._mirror_package, packages)
+
+        def threads():
+            for _ in mirror.downloader.download_all(jobs, 4):
+                pass
+
+        for name, method, task in [
+            ('process pool', pool, (mirror._mirror_package, packages[0])),
+            ('job queue', threads, jobs[0]),
+        ]:
+            elapsed, peak = measure(method)
+            print('{:<13} {:>8.3f} s for {} tasks, {:>10,} bytes per task, peak {:.1f} MB'.format(
+                name, elapsed, len(packages), len(pickle.dumps(task)), peak / 2**20
+            ))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
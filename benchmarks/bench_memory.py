@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Benchmark of the memory footprint of parsed packages
+
+Reports the memory allocated per 100k packages for `BinaryPackage` and `CompactBinaryPackage`, after accessing the
+fields `APTRepository.packages` needs to build its indexes.
+
+    PYTHONPATH=. python benchmarks/bench_memory.py [count]
+"""
+import sys
+import tracemalloc
+
+from apt_repo import BinaryPackage, CompactBinaryPackage, _iter_stanzas
+from fixtures import make_packages
+
+
+def measure(package_class, content):
+    tracemalloc.start()
+    packages = []
+    for stanza in _iter_stanzas([content]):
+        pack = package_class(stanza, None)
+        pack.package
+        pack.provides
+        packages.append(pack)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak
+
+
+def main(count=100000):
+    content = make_packages(count).encode('utf-8')
+    for package_class in [BinaryPackage, CompactBinaryPackage]:
+        current, peak = measure(package_class, content)
+        print('{:<22} {:>8.1f} MB per 100k packages (peak {:.1f} MB)'.format(
+            package_class.__name__, current * 100000 / count / 2**20, peak * 100000 / count / 2**20
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Benchmark of stanza parsing throughput
+
+Compares the single-pass stanza parser against the former per-field regex lookups.
+
+    PYTHONPATH=. python benchmarks/bench_parse.py [count]
+"""
+import re
+import sys
+import time
+
+from apt_repo import PackagesFile
+from fixtures import make_packages
+
+
+FIELDS = ['Package', 'Version', 'Filename', 'SHA1', 'Architecture', 'Size', 'Provides', 'Depends', 'Pre-Depends']
+
+
+def _legacy_get_value(content, key):
+    match = re.search(r'^' + key + ': (.*)$', content, flags=re.MULTILINE)
+    try:
+        return match.group(1)
+    except AttributeError:
+        raise KeyError(content, key)
+
+
+def legacy(packages):
+    for pack in packages:
+        for field in FIELDS:
+            try:
+                _legacy_get_value(pack.content, field)
+            except KeyError:
+                pass
+
+
+def single_pass(packages):
+    for pack in packages:
+        for field in FIELDS:
+            pack.fields.get(field)
+
+
+def main(count=20000):
+    packages = PackagesFile(make_packages(count), None).packages
+    for name, method in [('legacy regex', legacy), ('single pass', single_pass)]:
+        start = time.perf_counter()
+        method(packages)
+        elapsed = time.perf_counter() - start
+        print('{:<14} {:>10,.0f} stanzas/sec'.format(name, count / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
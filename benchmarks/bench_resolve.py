@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Benchmark of dependency resolution
+
+Resolves the dependency closure of the first synthetic package, which pulls in a large part of the repository like
+`ubuntu-desktop` does, with `DependencyResolver` and with the former recursive implementation.
+
+    PYTHONPATH=. python benchmarks/bench_resolve.py [count]
+"""
+import logging
+import sys
+import tempfile
+import time
+
+from apt_repo import APTRepository, APTSources, DependencyResolver
+from fixtures import make_repository
+
+
+def legacy_dependencies(pack, sources, summed_deps):
+    summed_deps.add(pack)
+    for dep in pack.depends + pack.predepends:
+        if len([p for p in summed_deps if dep.fulfilled(p)]) > 0:
+            continue
+        for candidate in sources.packages_fulfilling(dep):
+            legacy_dependencies(candidate, sources, summed_deps)
+    return summed_deps
+
+
+def main(count=5000):
+    logging.disable(logging.WARNING)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * count))
+    with tempfile.TemporaryDirectory() as directory:
+        sources = APTSources([APTRepository(make_repository(directory, count, fanout=10), 'bionic', ['main'], ['amd64'])])
+        sources.load()
+
+    root = sources.get('mainpkg0').pop()
+    results = {}
+    for name, method in [
+        ('recursive', lambda: legacy_dependencies(root, sources, set())),
+        ('worklist', lambda: DependencyResolver(sources).add(root)),
+    ]:
+        start = time.perf_counter()
+        results[name] = method()
+        elapsed = time.perf_counter() - start
+        print('{:<10} {:>8.3f} s for a closure of {} packages'.format(name, elapsed, len(results[name])))
+    assert results['recursive'] == results['worklist']
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
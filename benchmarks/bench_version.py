@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+Microbenchmark of Debian version comparisons
+
+Compares the cached version keys of `apt_repo.version` against `pydpkg.Dpkg.compare_versions` on the versions of
+synthetic packages, comparing each version with a fixed set of constraint versions like dependency checks do.
+
+    PYTHONPATH=. python benchmarks/bench_version.py [count]
+"""
+import sys
+import time
+
+import pydpkg
+
+from apt_repo.version import compare_versions
+from fixtures import make_stanza
+
+
+def run(compare, versions, constraints):
+    start = time.perf_counter()
+    for constraint in constraints:
+        for version in versions:
+            compare(version, constraint)
+    return time.perf_counter() - start
+
+
+def main(count=2000):
+    versions = [make_stanza(i, count).split('\nVersion: ')[1].split('\n')[0] for i in range(count)]
+    constraints = versions[:20] + ['1.0~rc1', '2:1.0-1ubuntu1~18.04']
+    comparisons = len(versions) * len(constraints)
+    for name, compare in [('pydpkg', pydpkg.Dpkg.compare_versions), ('version_key', compare_versions)]:
+        elapsed = run(compare, versions, constraints)
+        print('{:<12} {:>12,.0f} comparisons/sec'.format(name, comparisons / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
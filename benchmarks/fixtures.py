@@ -0,0 +1,270 @@
+"""
+Synthetic APT repository fixtures for benchmarks
+
+The generated stanzas look like the ones found in real Packages files, including multi-line
+descriptions, provides and dependencies on other generated packages. Sources files list a source package
+per binary package whose build dependencies point at other generated packages. Repositories can be written with
+pool files whose sizes and checksums match their stanzas and served over HTTP by a local stand-in server.
+"""
+import contextlib
+import gzip
+import hashlib
+import http.server
+import lzma
+import os
+import random
+import re
+import socketserver
+import threading
+
+
+def make_payload(index, size):
+    """
+    Returns the deterministic content of the pool file of a synthetic package
+
+    # Arguments
+    index (int): index of the package
+    size (int): size of the content in bytes
+    """
+    block = hashlib.sha256(str(index).encode()).digest()
+    return (block * (size // len(block) + 1))[:size]
+
+
+def make_stanza(index, count, arch='amd64', fanout=4, rng=None, payload=None):
+    """
+    Returns a single synthetic Packages stanza
+
+    # Arguments
+    index (int): index of the package, used to derive its name
+    count (int): total number of packages, used to pick dependency targets
+    arch (str): architecture of the package
+    fanout (int): maximum number of dependencies
+    rng (random.Random): random number generator, default: seeded by index
+    payload (bytes): content of the pool file the size and checksums are computed from, default: None, which
+        uses a random size and checksums of the filename
+    """
+    rng = rng or random.Random(index)
+    name = 'pkg{}'.format(index)
+    version = '{}:{}.{}.{}-{}ubuntu{}'.format(
+        rng.randint(0, 2), rng.randint(0, 9), rng.randint(0, 20), rng.randint(0, 99),
+        rng.randint(1, 9), rng.randint(1, 3),
+    )
+    filename = 'pool/main/{}/{}/{}_{}_{}.deb'.format(name[0], name, name, version.split(':')[-1], arch)
+    size = rng.randint(1024, 2 ** 22)
+    content = filename.encode()
+    if payload is not None:
+        size, content = len(payload), payload
+    lines = [
+        'Package: ' + name,
+        'Architecture: ' + arch,
+        'Version: ' + version,
+        'Priority: optional',
+        'Section: ' + rng.choice(['libs', 'utils', 'devel', 'net', 'python']),
+        'Maintainer: Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>',
+        'Installed-Size: {}'.format(size // 1024),
+    ]
+    if index % 10 == 0:
+        lines.append('Provides: virtual{}, virtual-all'.format(index // 10))
+    deps = sorted({rng.randrange(index + 1, count) for _ in range(rng.randint(0, fanout))} if index + 1 < count else [])
+    if deps:
+        lines.append('Depends: ' + ', '.join(
+            'pkg{} (>= 0:0.{})'.format(dep, dep % 7) if dep % 3 == 0 else
+            'pkg{} | virtual{}'.format(dep, dep // 10) if dep % 5 == 0 else
+            'pkg{}'.format(dep)
+            for dep in deps
+        ))
+    if index % 4 == 0 and index + 1 < count:
+        lines.append('Recommends: pkg{}'.format(rng.randrange(index + 1, count)))
+    lines += [
+        'Filename: ' + filename,
+        'Size: {}'.format(size),
+        'MD5sum: ' + hashlib.md5(content).hexdigest(),
+        'SHA1: ' + hashlib.sha1(content).hexdigest(),
+        'SHA256: ' + hashlib.sha256(content).hexdigest(),
+        'Description: synthetic package number {}'.format(index),
+        ' This package was generated for benchmarking purposes.',
+        ' .',
+        ' It has no content at all.',
+    ]
+    return '\n'.join(lines)
+
+
+def make_packages(count, arch='amd64', fanout=4, payload_size=None):
+    """
+    Returns the content of a synthetic Packages file
+
+    # Arguments
+    count (int): number of stanzas
+    arch (str): architecture of all packages
+    fanout (int): maximum number of dependencies per package
+    payload_size (int): size of the pool files described by the stanzas, see `make_payload`, default: None
+    """
+    return '\n\n'.join(
+        make_stanza(i, count, arch, fanout, payload=None if payload_size is None else make_payload(i, payload_size))
+        for i in range(count)
+    ) + '\n'
+
+
+def make_source_stanza(index, count, fanout=4, rng=None, payload_size=None):
+    """
+    Returns a single synthetic Sources stanza for the source package of binary package index
+
+    # Arguments
+    index (int): index of the binary package built from the source package
+    count (int): total number of packages, used to pick build dependency targets
+    fanout (int): maximum number of build dependencies
+    rng (random.Random): random number generator, default: seeded by index
+    payload_size (int): size of the source files the sizes and checksums are computed from, default: None, which
+        uses random sizes and checksums of the filenames
+    """
+    rng = rng or random.Random(-index - 1)
+    name = 'src{}'.format(index)
+    version = '{}.{}-{}'.format(rng.randint(0, 9), rng.randint(0, 20), rng.randint(1, 9))
+    directory = 'pool/main/{}/{}'.format(name[0], name)
+    files = []
+    for offset, filename in enumerate(['{}_{}.dsc', '{}_{}.orig.tar.gz', '{}_{}.debian.tar.xz']):
+        filename = filename.format(name, version if offset != 1 else version.split('-')[0])
+        content = filename.encode() if payload_size is None else make_payload(-(3 * index + offset + 1), payload_size)
+        files.append((filename, rng.randint(512, 2 ** 20) if payload_size is None else len(content), content))
+    deps = sorted({rng.randrange(count) for _ in range(rng.randint(0, fanout))})
+    lines = [
+        'Package: ' + name,
+        'Binary: pkg{}'.format(index),
+        'Version: ' + version,
+        'Maintainer: Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>',
+        'Build-Depends: ' + ', '.join(['debhelper (>= 9)'] + [
+            'pkg{} [amd64]'.format(dep) if dep % 3 == 0 else
+            'pkg{} <!nocheck>'.format(dep) if dep % 5 == 0 else
+            'pkg{} | virtual{}'.format(dep, dep // 10)
+            for dep in deps
+        ]),
+        'Architecture: any',
+        'Standards-Version: 4.1.3',
+        'Format: 3.0 (quilt)',
+        'Files:',
+    ] + [' {} {} {}'.format(hashlib.md5(content).hexdigest(), size, filename) for filename, size, content in files] + [
+        'Checksums-Sha256:',
+    ] + [' {} {} {}'.format(hashlib.sha256(content).hexdigest(), size, filename)
+         for filename, size, content in files] + [
+        'Directory: ' + directory,
+        'Priority: optional',
+        'Section: ' + rng.choice(['libs', 'utils', 'devel', 'net', 'python']),
+    ]
+    return '\n'.join(lines)
+
+
+def make_sources(count, fanout=4, payload_size=None):
+    """
+    Returns the content of a synthetic Sources file
+
+    # Arguments
+    count (int): number of stanzas
+    fanout (int): maximum number of build dependencies per source package
+    payload_size (int): size of the source files described by the stanzas, see `make_payload`, default: None
+    """
+    return '\n\n'.join(make_source_stanza(i, count, fanout, payload_size=payload_size) for i in range(count)) + '\n'
+
+
+def _write(filename, data):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as fp:
+        fp.write(data)
+
+
+def make_repository(directory, count, dist='bionic', components=['main'], architectures=['amd64'], fanout=4,
+                    payload_size=None, sources=False):
+    """
+    Writes a synthetic repository with a Release file and xz and gzip compressed Packages and Sources files
+
+    Package names are prefixed with the component, so components do not share packages. If payload_size is given,
+    the pool files are written as well, so the packages can be downloaded and verified.
+    Returns the `file://` URL of the repository.
+
+    # Arguments
+    directory (str): directory to write the repository to
+    count (int): number of stanzas per Packages file
+    dist (str): name of the distribution
+    components (list): components of the repository
+    architectures (list): architectures of the repository
+    fanout (int): maximum number of dependencies per package
+    payload_size (int): size of each pool file in bytes, default: None, which writes no pool files
+    sources (bool): write a Sources file per component as well, default: False
+    """
+    checksums = []
+    for component in components:
+        indexes = [('binary-' + arch, 'Packages', make_packages(count, arch, fanout, payload_size))
+                   for arch in architectures]
+        if sources:
+            indexes.append(('source', 'Sources', make_sources(count, fanout, payload_size)))
+        for subdirectory, name, content in indexes:
+            content = content.replace('pkg', component + 'pkg')
+            if payload_size is not None and name == 'Packages':
+                filenames = re.findall(r'^Filename: (.*)$', content, flags=re.MULTILINE)
+                for index, filename in enumerate(filenames):
+                    _write(os.path.join(directory, *filename.split('/')), make_payload(index, payload_size))
+            elif payload_size is not None:
+                for index, stanza in enumerate(content.split('\n\n')):
+                    folder = re.search(r'^Directory: (.*)$', stanza, flags=re.MULTILINE).group(1)
+                    filenames = re.findall(r'^ [0-9a-f]{64} \d+ (.*)$', stanza, flags=re.MULTILINE)
+                    for offset, filename in enumerate(filenames):
+                        _write(os.path.join(directory, *folder.split('/'), filename),
+                               make_payload(-(3 * index + offset + 1), payload_size))
+            content = content.encode('utf-8')
+            path = '/'.join([component, subdirectory, name])
+            for suffix, data in [('', content), ('.xz', lzma.compress(content)), ('.gz', gzip.compress(content))]:
+                checksums.append((hashlib.sha256(data).hexdigest(), len(data), path + suffix))
+                if suffix:
+                    _write(os.path.join(directory, 'dists', dist, *(path + suffix).split('/')), data)
+
+    with open(os.path.join(directory, 'dists', dist, 'Release'), 'w') as fp:
+        fp.write('\n'.join([
+            'Origin: Synthetic',
+            'Label: Synthetic',
+            'Suite: ' + dist,
+            'Codename: ' + dist,
+            'Date: Thu, 26 Apr 2018 23:37:48 UTC',
+            'Architectures: ' + ' '.join(architectures),
+            'Components: ' + ' '.join(components),
+            'Description: Synthetic repository for benchmarks',
+            'SHA256:',
+        ] + [' {} {:>16} {}'.format(*checksum) for checksum in checksums]) + '\n')
+
+    return 'file://' + os.path.abspath(directory)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Like `http.server.ThreadingHTTPServer`, which needs Python 3.7"""
+    daemon_threads = True
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the files below root, the `directory` argument of the handler needs Python 3.7"""
+    root = None
+
+    def translate_path(self, path):
+        path = super().translate_path(path)
+        return os.path.join(self.root, os.path.relpath(path, os.getcwd()))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve(directory):
+    """
+    Serves directory over HTTP on a free local port in a background thread
+
+    Yields the URL of the served directory, the server is shut down when the context is left.
+
+    # Arguments
+    directory (str): the directory to serve, e.g. written by `make_repository`
+    """
+    handler = type('_QuietHandler', (_QuietHandler,), {'root': os.path.abspath(directory)})
+    with _ThreadingHTTPServer(('127.0.0.1', 0), handler) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+        finally:
+            server.shutdown()
+            thread.join()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+"""
+Benchmark suite over synthetic repositories
+
+Generates repositories of the given sizes, serves them from a local HTTP server and measures
+
+- `parse`: parsing a Packages file in memory and reading the fields used for indexing and mirroring
+- `load`: downloading, decompressing and parsing a repository with `APTSources`
+- `parallel`: parsing a Packages file into indexable packages in the calling thread and in pools of 2, 4 and
+  all CPUs' processes, with the speedup over the calling thread and the CPU time left in the calling process
+- `memory`: memory allocated by the parsed packages
+- `resolve`: building the dependency graph, resolving the dependency closure of a package and solving an
+  installable set for it
+- `mirror`: mirroring packages with `APTDependencyMirror` and repeating the already complete mirror
+
+Everything runs offline. The results are printed and optionally written as JSON, a previous JSON result can be
+passed to compare against.
+
+    PYTHONPATH=. python benchmarks/run.py --sizes 1000,10000 --output results.json
+    PYTHONPATH=. python benchmarks/run.py --sizes 1000,10000 --compare results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from apt_repo import (APTRepository, APTSources, BinaryPackage, CompactBinaryPackage, DependencySolver, PackagesFile,
+                      _iter_stanzas)
+from apt_repo.apt_mirror import APTDependencyMirror, FilterAddArchitectureFromUrl
+from fixtures import make_packages, make_repository, serve
+
+
+DIST = 'bionic'
+
+
+def timed(method, repeat):
+    """Returns the shortest time of repeat calls of method and the result of the last call"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = method()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_parse(context):
+    content = make_packages(context['size'], fanout=context['fanout'])
+
+    def parse():
+        packages = PackagesFile(content, None).packages
+        for pack in packages:
+            pack.package, pack.version, pack.filename, pack.size, pack.provides, pack.depends
+        return packages
+
+    elapsed, packages = timed(parse, context['repeat'])
+    return {'seconds': elapsed, 'stanzas_per_second': len(packages) / elapsed}
+
+
+def bench_load(context):
+    metrics = {}
+    for name, compact in [('', False), ('compact_', True)]:
+        def load():
+            sources = APTSources([APTRepository(context['url'], DIST, ['main'], ['amd64'], compact=compact,
+                                                parse_processes=context['parse_processes'])])
+            sources.load()
+            return sources
+
+        elapsed, sources = timed(load, context['repeat'])
+        metrics[name + 'seconds'] = elapsed
+        metrics[name + 'stanzas_per_second'] = len(list(sources.packages)) / elapsed
+    return metrics
+
+
+def bench_parallel(context):
+    content = make_packages(context['size'], fanout=context['fanout']).encode('utf-8')
+    metrics = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'Packages')
+        with open(path, 'wb') as fp:
+            fp.write(content)
+        for name, compact in [('', False), ('compact_', True)]:
+            def parse(rep):
+                packages = rep._parse_packages([content], path)
+                for pack in packages:
+                    pack.package, pack.provides
+                return packages
+
+            serial, _ = timed(lambda: parse(APTRepository(context['url'], DIST, ['main'], ['amd64'],
+                                                          compact=compact)), context['repeat'])
+            metrics[name + 'serial_seconds'] = serial
+            for processes in sorted({2, 4, os.cpu_count() or 1} - {1}):
+                rep = APTRepository(context['url'], DIST, ['main'], ['amd64'], compact=compact,
+                                    parse_processes=processes)
+                rep._parse_pool()
+                elapsed, _ = timed(lambda: parse(rep), context['repeat'])
+                # CPU time spent in this process while the workers parse, which bounds the speedup on any machine
+                start = time.process_time()
+                parse(rep)
+                parent = time.process_time() - start
+                metrics['{}processes_{}_seconds'.format(name, processes)] = elapsed
+                metrics['{}processes_{}_speedup'.format(name, processes)] = serial / elapsed
+                metrics['{}processes_{}_parent_seconds'.format(name, processes)] = parent
+                rep._parse_pool().shutdown()
+    return metrics
+
+
+def bench_memory(context):
+    content = make_packages(context['size'], fanout=context['fanout']).encode('utf-8')
+    metrics = {}
+    for name, package_class in [('', BinaryPackage), ('compact_', CompactBinaryPackage)]:
+        tracemalloc.start()
+        packages = []
+        for stanza in _iter_stanzas([content]):
+            pack = package_class(stanza, None)
+            pack.package, pack.provides
+            packages.append(pack)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del packages
+        metrics[name + 'bytes_per_package'] = current / context['size']
+        metrics[name + 'peak_bytes'] = peak
+    return metrics
+
+
+def bench_resolve(context):
+    sources = APTSources([APTRepository(context['url'], DIST, ['main'], ['amd64'])])
+    sources.load()
+    root = sources.get('mainpkg0').pop()
+
+    elapsed, closure = timed(lambda: root.dependencies(sources), context['repeat'])
+    graph_elapsed, graph = timed(lambda: sources.graph, 1)
+    graph_closure_elapsed, graph_closure = timed(lambda: graph.closure([root]), context['repeat'])
+    assert closure == graph_closure
+    solve_elapsed, solved = timed(lambda: DependencySolver(sources).add(root), context['repeat'])
+    return {
+        'closure_size': len(closure),
+        'closure_seconds': elapsed,
+        'graph_seconds': graph_elapsed,
+        'graph_closure_seconds': graph_closure_elapsed,
+        'solved_size': len(solved),
+        'solve_seconds': solve_elapsed,
+    }
+
+
+def bench_mirror(context):
+    count = min(context['size'], context['mirror_count'])
+    with tempfile.TemporaryDirectory() as directory:
+        make_repository(os.path.join(directory, 'repo'), count, DIST, fanout=context['fanout'],
+                        payload_size=context['payload_size'])
+        with serve(os.path.join(directory, 'repo')) as url:
+            sources = APTSources([APTRepository(url, DIST, ['main'], ['amd64'])])
+            sources.load()
+            location = os.path.join(directory, 'mirror')
+
+            def create():
+                mirror = APTDependencyMirror(sources, location)
+                mirror.add_filter(FilterAddArchitectureFromUrl(url, 'amd64'))
+                mirror.create(context['workers'])
+                return mirror
+
+            elapsed, mirror = timed(create, 1)
+            incremental_elapsed, _ = timed(create, context['repeat'])
+
+    total = sum(pack.size for pack in mirror.packages_to_mirror)
+    return {
+        'files': len(mirror.packages_to_mirror),
+        'bytes': total,
+        'seconds': elapsed,
+        'bytes_per_second': total / elapsed,
+        'files_per_second': len(mirror.packages_to_mirror) / elapsed,
+        'incremental_seconds': incremental_elapsed,
+    }
+
+
+BENCHMARKS = {
+    'parse': bench_parse,
+    'load': bench_load,
+    'parallel': bench_parallel,
+    'memory': bench_memory,
+    'resolve': bench_resolve,
+    'mirror': bench_mirror,
+}
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def run(args):
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            make_repository(directory, size, DIST, fanout=args.fanout)
+            with serve(directory) as url:
+                context = dict(vars(args), size=size, url=url)
+                for name in args.benchmarks:
+                    metrics = BENCHMARKS[name](context)
+                    results.append({'benchmark': name, 'size': size, 'metrics': metrics})
+                    print('{:<8} {:>7} {}'.format(name, size, ', '.join(
+                        '{}={:,.3f}'.format(key, value) if isinstance(value, float) else '{}={:,}'.format(key, value)
+                        for key, value in metrics.items()
+                    )), flush=True)
+    return {'environment': environment(), 'results': results}
+
+
+def compare(baseline, report):
+    """Prints the ratio of each metric to the same metric in baseline"""
+    previous = {(r['benchmark'], r['size']): r['metrics'] for r in baseline['results']}
+    print('\nCompared to {} ({}):'.format(baseline['environment'].get('commit'), baseline['environment'].get('time')))
+    for result in report['results']:
+        old = previous.get((result['benchmark'], result['size']), {})
+        for key, value in result['metrics'].items():
+            if old.get(key):
+                print('{:<8} {:>7} {:<32} {:>14,.3f} -> {:>14,.3f} ({:+.1%})'.format(
+                    result['benchmark'], result['size'], key, old[key], value, value / old[key] - 1
+                ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=[1000, 10000],
+                        help='comma separated numbers of stanzas, default: 1000,10000')
+    parser.add_argument('--benchmarks', type=lambda value: value.split(','), default=list(BENCHMARKS),
+                        help='comma separated benchmarks out of {}, default: all'.format(','.join(BENCHMARKS)))
+    parser.add_argument('--fanout', type=int, default=4, help='maximum dependencies per package, default: 4')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of timed steps, default: 3')
+    parser.add_argument('--parse-processes', type=int, default=None,
+                        help='processes parsing each Packages file in the load benchmark, default: parse in threads')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent mirror downloads, default: 4')
+    parser.add_argument('--mirror-count', type=int, default=2000,
+                        help='maximum number of packages to mirror, default: 2000')
+    parser.add_argument('--payload-size', type=int, default=64 * 1024,
+                        help='size of each mirrored package in bytes, default: 65536')
+    parser.add_argument('--output', help='file to write the results to as JSON')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+
+    logging.disable(logging.WARNING)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(json.load(fp), report)
+
+
+if __name__ == '__main__':
+    main()
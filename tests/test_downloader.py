@@ -0,0 +1,72 @@
+import hashlib
+import http.server
+import os
+import socketserver
+import tempfile
+import threading
+
+from apt_repo.downloader import Downloader, DownloadJob
+
+
+CONTENT = bytes(range(256)) * 64
+
+
+class _InterruptingHandler(http.server.BaseHTTPRequestHandler):
+    """Breaks off the first response halfway and answers later range requests"""
+    ranges = []
+
+    def do_GET(self):
+        header = self.headers.get('Range')
+        self.ranges.append(header)
+        if header is None:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(CONTENT)))
+            self.end_headers()
+            self.wfile.write(CONTENT[:len(CONTENT) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        offset = int(header.split('=')[1].rstrip('-'))
+        self.send_response(206)
+        self.send_header('Content-Length', str(len(CONTENT) - offset))
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(offset, len(CONTENT) - 1, len(CONTENT)))
+        self.end_headers()
+        self.wfile.write(CONTENT[offset:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def test_download_resumes_after_connection_error():
+    _InterruptingHandler.ranges = []
+    server = _Server(('127.0.0.1', 0), _InterruptingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        path = os.path.join(tempfile.mkdtemp(), 'pool', 'file.deb')
+        job = DownloadJob(
+            'http://127.0.0.1:{}/file.deb'.format(server.server_address[1]), path, len(CONTENT),
+            ('sha256', hashlib.sha256(CONTENT).hexdigest())
+        )
+        results = list(Downloader(chunk_size=1024).download_all([job], retries=1))
+    finally:
+        server.shutdown()
+        thread.join()
+
+    assert results == [(job, True)]
+    assert _InterruptingHandler.ranges[0] is None
+    assert _InterruptingHandler.ranges[1] == 'bytes={}-'.format(len(CONTENT) // 2)
+    with open(path, 'rb') as fp:
+        assert fp.read() == CONTENT
+    assert not os.path.exists(path + '.part')
+
+
+def test_download_all_reports_unreachable_hosts_as_failed():
+    path = os.path.join(tempfile.mkdtemp(), 'file.deb')
+    job = DownloadJob('http://127.0.0.1:1/file.deb', path, None, None)
+    assert list(Downloader(timeout=5).download_all([job], retries=1)) == [(job, False)]
+    assert not os.path.exists(path)
@@ -0,0 +1,35 @@
+from apt_repo import APTRepository, APTSources, DependencyResolver, PackagesFile
+
+
+def _repository(url, stanzas):
+    rep = APTRepository(url, 'bionic', ['main'], ['amd64'])
+    content = '\n\n'.join(
+        'Package: {}\nVersion: 1.0\nArchitecture: amd64\n{}'.format(name, fields) for name, fields in stanzas
+    )
+    rep._set_packages([PackagesFile(content, rep).packages])
+    return rep
+
+
+def _closure(sources):
+    resolver = DependencyResolver(sources)
+    for pack in sources.get('root'):
+        resolver.add(pack)
+    return {pack.package for pack in resolver.selected}
+
+
+def test_graph_keeps_the_candidate_order_of_multiple_repositories():
+    def sources():
+        return APTSources([
+            _repository('http://first.example', [
+                ('root', 'Depends: a | b'), ('b', 'Depends: c | d'), ('c', ''),
+            ]),
+            _repository('http://second.example', [
+                ('a', 'Depends: d'), ('d', ''),
+            ]),
+        ])
+
+    without_graph = _closure(sources())
+    with_graph = sources()
+    with_graph.graph
+    assert without_graph == {'root', 'a', 'b', 'c', 'd'}
+    assert _closure(with_graph) == without_graph